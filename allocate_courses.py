@@ -1,93 +1,473 @@
-import mysql.connector
-from mysql.connector import Error
-
-# Replace with your MySQL details
-MYSQL_HOST = "localhost"
-MYSQL_USER = "root"
-MYSQL_PASSWORD = "password"
-MYSQL_DB = "course_allocator_db"
-
-def create_db_connection():
-    # ... (connection function remains the same)
-    connection = None
+import argparse
+from functools import partial
+
+from allocation_metrics import METRICS_QUERY, metrics_from_allocation, metrics_from_rows
+from db import Error, create_db_connection, get_backend, run_query
+from instrumentation import get_tracer, profile_to, start_trace
+from results_writer import AllocationResultsWriter
+from waitlists import refresh_waitlists
+
+# The in-memory engines (allocation_engine, sharding) and snapshots pull in
+# NumPy, pandas and pyarrow, so they are imported by the functions that use
+# them. The SQL engine and the metrics command start without those libraries.
+
+# Each course admits its highest-CGPA unallocated applicants for one rank, up
+# to the seats it has left after the earlier ranks.
+ALLOCATION_PASS_QUERY = """
+    SELECT
+        t.student_id,
+        t.course_id,
+        t.preference_rank
+    FROM (
+        SELECT
+            p.student_id,
+            p.course_id,
+            p.preference_rank,
+            rc.seats_left,
+            ROW_NUMBER() OVER (PARTITION BY p.course_id ORDER BY u.cgpa DESC, p.student_id) as rn
+        FROM
+            Preferences p
+        JOIN
+            Unallocated_Students u ON p.student_id = u.student_id
+        JOIN
+            Residual_Capacity rc ON p.course_id = rc.course_id
+        WHERE
+            p.preference_rank = %s
+            AND rc.seats_left > 0
+    ) as t
+    WHERE
+        t.rn <= t.seats_left
+"""
+
+# Per-course and per-major summaries of a run, written after every run so the
+# dashboard reads O(courses + majors) rows instead of the raw tables. {where}
+# can restrict Course_Summary to some courses.
+COURSE_SUMMARY_QUERY = """
+    INSERT INTO Course_Summary (course_id, course_name, department, max_capacity, preference_rank, preferences, allocated)
+    SELECT
+        c.course_id,
+        c.course_name,
+        c.department,
+        c.max_capacity,
+        p.preference_rank,
+        COUNT(p.student_id),
+        COUNT(ar.student_id)
+    FROM Courses c
+    LEFT JOIN Preferences p ON p.course_id = c.course_id
+    LEFT JOIN Allocation_Results ar ON ar.student_id = p.student_id AND ar.course_id = p.course_id
+    {where}
+    GROUP BY c.course_id, c.course_name, c.department, c.max_capacity, p.preference_rank;
+"""
+
+MAJOR_SUMMARY_QUERY = """
+    INSERT INTO Major_Summary (major, students, allocated, first_choice_preferences, first_choice_allocated)
+    SELECT
+        s.major,
+        COUNT(*),
+        COUNT(a.student_id),
+        COALESCE(SUM(f.preferences), 0),
+        COALESCE(SUM(f.allocated), 0)
+    FROM Students s
+    LEFT JOIN (SELECT DISTINCT student_id FROM Allocation_Results) a ON a.student_id = s.student_id
+    LEFT JOIN (
+        SELECT p.student_id, COUNT(*) AS preferences, COUNT(ar.student_id) AS allocated
+        FROM Preferences p
+        LEFT JOIN Allocation_Results ar ON ar.student_id = p.student_id AND ar.course_id = p.course_id
+        WHERE p.preference_rank = 1
+        GROUP BY p.student_id
+    ) f ON f.student_id = s.student_id
+    GROUP BY s.major;
+"""
+
+# Engines whose results are the rank passes' allocation, which
+# reallocate_incremental() can update. Deferred acceptance and the live service
+# produce other allocations.
+RANK_PASS_ENGINES = ("sql", "numpy", "sharded", "incremental")
+
+def allocate_courses(engine="sql", snapshot=False, courses_per_student=1, shard_by="department", workers=None):
+    """
+    Clears previous results, allocates courses and returns the run's
+    AllocationMetrics.
+
+    engine="sql" runs one INSERT ... SELECT per preference rank on the server;
+    engine="numpy" loads the data once and allocates in memory (see
+    allocation_engine.py). Both produce the same allocations, and so does
+    engine="sharded", which splits the courses by `shard_by` ("department" or
+    "component") and allocates the shards in up to `workers` processes (see
+    sharding.py). engine="deferred" computes the stable matching with deferred acceptance
+    instead, giving each student up to `courses_per_student` courses. With
+    snapshot=True the run is also saved as a columnar snapshot (see
+    snapshots.py). Every run also rebuilds the per-course Waitlists (see
+    waitlists.py).
+
+    Every stage is timed and, with ALLOCATOR_TRACE set, written to a
+    JSON-lines trace (see instrumentation.py).
+    """
+    connection = create_db_connection()
+    if not connection:
+        return
+
+    tracer = start_trace()
+    if engine == "numpy":
+        metrics = allocate_in_memory(connection)
+    elif engine == "deferred":
+        from allocation_engine import deferred_acceptance
+        metrics = allocate_in_memory(connection, partial(deferred_acceptance, courses_per_student=courses_per_student))
+    elif engine == "sharded":
+        from sharding import allocate_sharded, load_course_departments
+        departments = load_course_departments(connection) if shard_by == "department" else None
+        metrics = allocate_in_memory(connection, partial(allocate_sharded, departments=departments, workers=workers))
+    else:
+        if not allocate_with_sql(connection):
+            print("\n--- Allocation failed; Allocation_Results is unchanged ---")
+            connection.close()
+            return
+        metrics = None
+
+    print("\n--- Allocation process complete ---")
+    print("\n--- Generating Allocation Metrics ---")
+    if metrics is None:
+        metrics = get_allocation_metrics(connection)
+    if metrics is not None:
+        metrics.print_report()
+
+    refresh_waitlists(connection)
+    refresh_summary_tables(connection)
+    allocated_count = metrics.allocated_count if metrics else None
+    record_allocation_run(connection, engine, allocated_count)
+    run_id = current_allocation_run(connection)
+    if snapshot:
+        from snapshots import write_snapshot
+        with tracer.stage("snapshot"):
+            write_snapshot(connection, run_id)
+    tracer.finish(run_id, engine=engine, allocated_count=allocated_count)
+    connection.close()
+    return metrics
+
+def create_summary_tables(connection):
+    """Creates the Course_Summary and Major_Summary tables if they do not exist yet."""
+    run_query(connection, """
+        CREATE TABLE IF NOT EXISTS Course_Summary (
+            course_id INT NOT NULL,
+            course_name VARCHAR(255) NOT NULL,
+            department VARCHAR(255) NOT NULL,
+            max_capacity INT NOT NULL,
+            preference_rank INT,
+            preferences INT NOT NULL,
+            allocated INT NOT NULL
+        );
+    """)
+    run_query(connection, """
+        CREATE TABLE IF NOT EXISTS Major_Summary (
+            major VARCHAR(255),
+            students INT NOT NULL,
+            allocated INT NOT NULL,
+            first_choice_preferences INT NOT NULL,
+            first_choice_allocated INT NOT NULL
+        );
+    """)
+
+def refresh_summary_tables(connection, course_ids=None):
+    """
+    Rebuilds Course_Summary (one row per course and preference rank) and
+    Major_Summary (one row per major) from the current Allocation_Results, in
+    one transaction so readers never see them half-written. With `course_ids`,
+    only those courses' Course_Summary rows are rebuilt.
+    """
+    create_summary_tables(connection)
+    cursor = connection.cursor()
     try:
-        connection = mysql.connector.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            passwd=MYSQL_PASSWORD,
-            database=MYSQL_DB
-        )
-        print("MySQL Database connection successful.")
+        with get_tracer().stage("refresh_summaries") as record:
+            record["rows"] = 0
+            if course_ids is None:
+                cursor.execute("DELETE FROM Course_Summary;")
+                cursor.execute(COURSE_SUMMARY_QUERY.format(where=""))
+                record["rows"] = cursor.rowcount
+            elif course_ids:
+                placeholders = ", ".join(["%s"] * len(course_ids))
+                cursor.execute(f"DELETE FROM Course_Summary WHERE course_id IN ({placeholders});", tuple(course_ids))
+                cursor.execute(COURSE_SUMMARY_QUERY.format(where=f"WHERE c.course_id IN ({placeholders})"),
+                               tuple(course_ids))
+                record["rows"] = cursor.rowcount
+            cursor.execute("DELETE FROM Major_Summary;")
+            cursor.execute(MAJOR_SUMMARY_QUERY)
+            record["rows"] += cursor.rowcount
+            connection.commit()
     except Error as err:
         print(f"Error: '{err}'")
-    return connection
+        connection.rollback()
+    finally:
+        cursor.close()
 
-def run_query(connection, query, data=None):
-    # ... (query execution function remains the same)
+def create_runs_table(connection):
+    """
+    Creates the Allocation_Runs table if it does not exist yet. Every run that
+    rewrites Allocation_Results adds a row, so MAX(run_id) works as a version
+    number for anything derived from the results, such as the dashboard cache.
+    """
+    run_query(connection, f"""
+        CREATE TABLE IF NOT EXISTS Allocation_Runs (
+            run_id {get_backend().id_column},
+            engine VARCHAR(32) NOT NULL,
+            allocated_count INT,
+            finished_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+def record_allocation_run(connection, engine, allocated_count=None):
+    """Records a finished run, which bumps the allocation version."""
+    create_runs_table(connection)
+    run_query(connection, "INSERT INTO Allocation_Runs (engine, allocated_count) VALUES (%s, %s);",
+              (engine, allocated_count))
+
+def current_allocation_engine(connection):
+    """Returns the engine of the latest allocation run, or None if none was recorded."""
     cursor = connection.cursor()
     try:
-        if data:
-            cursor.execute(query, data)
-        else:
-            cursor.execute(query)
-        connection.commit()
+        cursor.execute("SELECT engine FROM Allocation_Runs ORDER BY run_id DESC LIMIT 1;")
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except Error:
+        return None
+    finally:
+        cursor.close()
+
+def current_allocation_run(connection):
+    """Returns the id of the latest allocation run, or 0 if none was recorded."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT COALESCE(MAX(run_id), 0) FROM Allocation_Runs;")
+        return cursor.fetchone()[0]
+    except Error:
+        return 0
+    finally:
+        cursor.close()
+
+def allocate_with_sql(connection):
+    """
+    Allocates courses with one INSERT ... SELECT per preference rank.
+
+    Two working tables are kept up to date between ranks: Residual_Capacity
+    holds the seats each course has left and Unallocated_Students holds the
+    students still waiting for a seat. Each pass therefore only ranks the
+    students and courses that are still in play and never admits more
+    students than a course has seats left.
+
+    The passes write to a staging table that replaces Allocation_Results once
+    every rank is done, so readers keep seeing the previous run until then.
+    Returns True if the new results were swapped in; if any pass fails the
+    staging table is dropped and False is returned.
+    """
+    tracer = get_tracer()
+    with tracer.stage("working_tables"):
+        create_working_tables(connection)
+
+    cursor = connection.cursor()
+    cursor.execute("SELECT DISTINCT preference_rank FROM Preferences ORDER BY preference_rank;")
+    ranks = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+
+    # Loop through each preference rank (1, 2, 3, ...). The passes run on a
+    # cursor that raises, so a failed pass discards the staging table instead
+    # of swapping in a partial allocation.
+    print("\n--- Starting allocation process ---")
+    writer = AllocationResultsWriter(connection)
+    try:
+        with writer:
+            staging = writer.staging_table
+            for rank in ranks:
+                print(f"\nAttempting to allocate courses for preference rank {rank}...")
+
+                with tracer.stage("rank_pass", rank=rank) as record:
+                    cursor = connection.cursor()
+                    try:
+                        cursor.execute(f"SELECT COALESCE(MAX(allocation_id), 0) FROM {staging};")
+                        last_allocation_id = cursor.fetchone()[0]
+                        tracer.explain_query(record, cursor, ALLOCATION_PASS_QUERY, (rank,))
+
+                        cursor.execute(f"INSERT INTO {staging} (student_id, course_id, preference_rank)"
+                                       + ALLOCATION_PASS_QUERY + ";", (rank,))
+                        record["rows"] = cursor.rowcount
+
+                        # Only the rows inserted by this pass change the working tables.
+                        cursor.execute(f"""
+                            UPDATE Residual_Capacity
+                            SET seats_left = seats_left - (
+                                SELECT COUNT(*)
+                                FROM {staging} ar
+                                WHERE ar.course_id = Residual_Capacity.course_id
+                                    AND ar.allocation_id > %s
+                            );
+                        """, (last_allocation_id,))
+                        cursor.execute(f"""
+                            DELETE FROM Unallocated_Students
+                            WHERE student_id IN (
+                                SELECT student_id FROM {staging} WHERE allocation_id > %s
+                            );
+                        """, (last_allocation_id,))
+                        connection.commit()
+                    finally:
+                        cursor.close()
     except Error as err:
         print(f"Error: '{err}'")
         connection.rollback()
     finally:
-        cursor.close()
+        drop_working_tables(connection)
+    return writer.swapped
+
+def create_working_tables(connection):
+    """Creates and fills the Residual_Capacity and Unallocated_Students working tables."""
+    print("\n--- Preparing residual capacity ---")
+    drop_working_tables(connection)
+    run_query(connection, """
+        CREATE TEMPORARY TABLE Residual_Capacity (
+            course_id INT PRIMARY KEY,
+            seats_left INT NOT NULL
+        );
+    """)
+    run_query(connection, """
+        CREATE TEMPORARY TABLE Unallocated_Students (
+            student_id INT PRIMARY KEY,
+            cgpa DECIMAL(3, 2) NOT NULL
+        );
+    """)
+    run_query(connection, "INSERT INTO Residual_Capacity (course_id, seats_left) SELECT course_id, max_capacity FROM Courses;")
+    run_query(connection, "INSERT INTO Unallocated_Students (student_id, cgpa) SELECT student_id, cgpa FROM Students;")
+
+def drop_working_tables(connection):
+    run_query(connection, "DROP TABLE IF EXISTS Residual_Capacity;")
+    run_query(connection, "DROP TABLE IF EXISTS Unallocated_Students;")
+
+def allocate_in_memory(connection, allocator=None):
+    """
+    Loads Students, Courses and Preferences once, allocates with `allocator`
+    (the NumPy rank passes by default) and streams the allocations into
+    Allocation_Results through a staging table in large batches. Returns the
+    run's AllocationMetrics, computed from the in-memory state, or None if the
+    results could not be written.
+    """
+    from allocation_engine import allocate, allocation_rows, load_allocation_data
+
+    allocator = allocator or allocate
+    tracer = get_tracer()
+    print("\n--- Loading allocation data ---")
+    with tracer.stage("load_data") as record:
+        data = load_allocation_data(connection)
+        record["rows"] = len(data.pref_rank)
+    print(f"Loaded {data.num_students} students, {data.num_courses} courses "
+          f"and {len(data.pref_rank)} preferences.")
+
+    print("\n--- Starting allocation process ---")
+    with tracer.stage("allocate") as record:
+        student_index, course_index, ranks = allocator(data)
+        record["rows"] = len(student_index)
+
+    try:
+        with AllocationResultsWriter(connection) as writer:
+            with tracer.stage("write_results") as record:
+                writer.write(allocation_rows(data, student_index, course_index, ranks))
+                writer.flush()
+                record["rows"] = writer.rows_written
+    except Error as err:
+        print(f"Error: '{err}'")
+        connection.rollback()
+        return None
+    if not writer.swapped:
+        return None
+    print(f"Inserted {writer.rows_written} allocations.")
+
+    return metrics_from_allocation(data, student_index, course_index, ranks)
+
+def reallocate_incremental(changed_students=(), changed_courses=(), snapshot=False):
+    """
+    Re-allocates only the students displaced by a changeset.
+
+    `changed_students` are students whose Preferences rows were edited and
+    `changed_courses` are courses whose max_capacity changed; both must already
+    be saved in the database. The current Allocation_Results must come from the
+    rank passes (see RANK_PASS_ENGINES). Starting from the changes, the chain
+    of students who are bumped from or moved into a course is followed in CGPA
+    order (see allocation_engine.reallocate_displaced), and only the resulting
+    difference is applied to Allocation_Results, in a single transaction, so
+    the table is never empty.
+    """
+    import numpy as np
+
+    from allocation_engine import allocation_rows, load_allocation_data, reallocate_displaced
 
-def allocate_courses():
     connection = create_db_connection()
     if not connection:
         return
 
-    print("\n--- Clearing previous allocation results ---")
-    run_query(connection, "DELETE FROM Allocation_Results;")
-    run_query(connection, "ALTER TABLE Allocation_Results AUTO_INCREMENT = 1;")
+    engine = current_allocation_engine(connection)
+    if engine not in RANK_PASS_ENGINES:
+        made_by = f"was made by the '{engine}' engine" if engine else "has no recorded run"
+        print(f"Error: the current allocation {made_by} and cannot be updated incrementally; "
+              f"run a full allocation instead.")
+        connection.close()
+        return
 
-    # Loop through each preference rank (1, 2, 3)
-    print("\n--- Starting allocation process ---")
-    for rank in range(1, 4):
-        print(f"\nAttempting to allocate courses for preference rank {rank}...")
-
-        # Revised allocation query for a single run
-        # This query is still a bit simple, but it's a good first fix.
-        # It's better than the last version but still has limitations
-        # on truly fair, granular allocation per course.
-        allocation_query = f"""
-            INSERT INTO Allocation_Results (student_id, course_id)
-            SELECT
-                t.student_id,
-                t.course_id
-            FROM (
-                SELECT
-                    p.student_id,
-                    p.course_id,
-                    ROW_NUMBER() OVER (PARTITION BY p.course_id ORDER BY s.cgpa DESC) as rn
-                FROM
-                    Preferences p
-                JOIN
-                    Students s ON p.student_id = s.student_id
-                LEFT JOIN
-                    Allocation_Results ar ON p.student_id = ar.student_id
-                WHERE
-                    p.preference_rank = {rank}
-                    AND ar.student_id IS NULL
-            ) as t
-            JOIN
-                Courses c ON t.course_id = c.course_id
-            WHERE
-                t.rn <= c.max_capacity
-            ;
-        """
-        run_query(connection, allocation_query)
-    
-    # ... (rest of the code for reporting remains the same)
-    print("\n--- Allocation process complete ---")
-    print("\n--- Generating Allocation Metrics ---")
-    get_allocation_metrics(connection)
+    tracer = start_trace()
+    print("\n--- Loading allocation data ---")
+    with tracer.stage("load_data") as record:
+        data = load_allocation_data(connection)
+
+        cursor = connection.cursor()
+        cursor.execute("SELECT student_id, course_id, preference_rank FROM Allocation_Results;")
+        current_rows = cursor.fetchall()
+        cursor.close()
+        record["rows"] = len(data.pref_rank) + len(current_rows)
 
+    held_course = np.full(data.num_students, -1, dtype=np.int32)
+    held_rank = np.zeros(data.num_students, dtype=np.int16)
+    if current_rows:
+        current = np.array(current_rows, dtype=np.int64)
+        students = data.index_students(current[:, 0])
+        held_course[students] = data.index_courses(current[:, 1])
+        held_rank[students] = current[:, 2]
+
+    with tracer.stage("allocate") as record:
+        student_index, course_index, ranks, evaluated = reallocate_displaced(
+            data, held_course, held_rank, data.index_students(list(changed_students)),
+            data.index_courses(list(changed_courses)))
+        record["rows"] = evaluated
+    print(f"Re-evaluated {evaluated} preferences; {len(student_index)} of {data.num_students} students "
+          f"changed allocation.")
+
+    moved_ids = set(data.student_ids[student_index].tolist())
+    removed = sorted(row[:2] for row in current_rows if row[0] in moved_ids)
+    keep = course_index >= 0
+    added = sorted(allocation_rows(data, student_index[keep], course_index[keep], ranks[keep]))
+
+    cursor = connection.cursor()
+    try:
+        with tracer.stage("apply_diff") as record:
+            if removed:
+                cursor.executemany("DELETE FROM Allocation_Results WHERE student_id = %s AND course_id = %s;", removed)
+            if added:
+                cursor.executemany("INSERT INTO Allocation_Results (student_id, course_id, preference_rank) "
+                                   "VALUES (%s, %s, %s);", added)
+            connection.commit()
+            record["rows"] = len(removed) + len(added)
+        print(f"Removed {len(removed)} and added {len(added)} allocations.")
+    except Error as err:
+        print(f"Error: '{err}'")
+        connection.rollback()
+        connection.close()
+        return
+    finally:
+        cursor.close()
+
+    refresh_waitlists(connection)
+    refresh_summary_tables(connection)
+    allocated_count = len(current_rows) - len(removed) + len(added)
+    record_allocation_run(connection, "incremental", allocated_count)
+    run_id = current_allocation_run(connection)
+    if snapshot:
+        from snapshots import write_snapshot
+        with tracer.stage("snapshot"):
+            write_snapshot(connection, run_id)
+    tracer.finish(run_id, engine="incremental", allocated_count=allocated_count)
     connection.close()
 
 # The rest of the functions (get_allocation_metrics, and the __main__ block) remain the same.
@@ -97,81 +477,60 @@ def allocate_courses():
 
 def get_allocation_metrics(connection):
     """
-    Calculates and prints key allocation metrics, including 3rd preference and unallocated students.
+    Computes the key allocation metrics in a single round trip and returns
+    them as an AllocationMetrics object, or None if the query fails.
     """
+    tracer = get_tracer()
     cursor = connection.cursor()
+    try:
+        with tracer.stage("metrics") as record:
+            tracer.explain_query(record, cursor, METRICS_QUERY)
+            cursor.execute(METRICS_QUERY)
+            rows = cursor.fetchall()
+            record["rows"] = len(rows)
+        return metrics_from_rows(rows)
+    except Error as err:
+        print(f"Error: '{err}'")
+        return None
+    finally:
+        cursor.close()
 
-    # Metric 1: Total students allocated
-    cursor.execute("SELECT COUNT(DISTINCT student_id) FROM Allocation_Results;")
-    allocated_count = cursor.fetchone()[0]
-    print(f"Total students allocated: {allocated_count}")
-    
-    # Metric 2: Students who received their first choice
-    cursor.execute("""
-        SELECT COUNT(DISTINCT a.student_id)
-        FROM Allocation_Results a
-        JOIN Preferences p ON a.student_id = p.student_id AND a.course_id = p.course_id
-        WHERE p.preference_rank = 1;
-    """)
-    first_choice_count = cursor.fetchone()[0]
-    print(f"Students who received their first choice: {first_choice_count}")
-    
-    # Metric 3: Students who received their second choice
-    cursor.execute("""
-        SELECT COUNT(DISTINCT a.student_id)
-        FROM Allocation_Results a
-        JOIN Preferences p ON a.student_id = p.student_id AND a.course_id = p.course_id
-        WHERE p.preference_rank = 2;
-    """)
-    second_choice_count = cursor.fetchone()[0]
-    print(f"Students who received their second choice: {second_choice_count}")
-
-    # NEW METRIC: Students who received their third choice
-    cursor.execute("""
-        SELECT COUNT(DISTINCT a.student_id)
-        FROM Allocation_Results a
-        JOIN Preferences p ON a.student_id = p.student_id AND a.course_id = p.course_id
-        WHERE p.preference_rank = 3;
-    """)
-    third_choice_count = cursor.fetchone()[0]
-    print(f"Students who received their third choice: {third_choice_count}")
-
-    # NEW METRIC: Unallocated students
-    cursor.execute("SELECT COUNT(*) FROM Students;")
-    total_students = cursor.fetchone()[0]
-    unallocated_count = total_students - allocated_count
-    print(f"Total students: {total_students}")
-    print(f"Total unallocated students: {unallocated_count}")
-
-    # Metric 4: Courses with remaining seats (vacancies)
-    cursor.execute("""
-        SELECT c.course_name, c.max_capacity - COUNT(ar.student_id) AS remaining_seats
-        FROM Courses c
-        LEFT JOIN Allocation_Results ar ON c.course_id = ar.course_id
-        GROUP BY c.course_id
-        HAVING remaining_seats > 0
-        ORDER BY remaining_seats DESC;
-    """)
-    vacant_courses = cursor.fetchall()
-    print("\nCourses with Remaining Seats:")
-    for course, seats in vacant_courses:
-        print(f"- {course}: {seats} seats")
-    
-    # Metric 5: Courses that were oversubscribed
-    cursor.execute("""
-        SELECT c.course_name, COUNT(p.student_id) AS total_preferences, c.max_capacity
-        FROM Courses c
-        JOIN Preferences p ON c.course_id = p.course_id
-        GROUP BY c.course_id
-        HAVING total_preferences > c.max_capacity
-        ORDER BY total_preferences DESC;
-    """)
-    oversubscribed_courses = cursor.fetchall()
-    print("\nOversubscribed Courses (Demand > Capacity):")
-    for course, demand, capacity in oversubscribed_courses:
-        print(f"- {course}: Demand={demand}, Capacity={capacity}")
+def metrics_main(argv=None, prog=None):
+    """Command line entry point that prints the metrics of the current Allocation_Results."""
+    argparse.ArgumentParser(prog=prog, description="Print the metrics of the current allocation.").parse_args(argv)
+    connection = create_db_connection()
+    if not connection:
+        return
+    metrics = get_allocation_metrics(connection)
+    if metrics is not None:
+        metrics.print_report()
+    connection.close()
 
-    cursor.close()
+def main(argv=None, prog=None):
+    """Command line entry point; `argv` defaults to sys.argv[1:]."""
+    parser = argparse.ArgumentParser(prog=prog, description="Run the course allocation.")
+    parser.add_argument("--engine", choices=["sql", "numpy", "sharded", "deferred"], default="sql",
+                        help="allocate with per-rank SQL passes, the in-memory NumPy engine (in one process or "
+                             "sharded across several) or stable deferred acceptance")
+    parser.add_argument("--shard-by", choices=["department", "component"], default="department",
+                        help="how the sharded engine splits the courses")
+    parser.add_argument("--workers", type=int, help="processes for the sharded engine (default: one per CPU)")
+    parser.add_argument("--courses-per-student", type=int, default=1,
+                        help="courses each student may hold (deferred engine only)")
+    parser.add_argument("--changed-students", type=int, nargs="+", default=[], metavar="STUDENT_ID",
+                        help="re-allocate incrementally after these students edited their preferences")
+    parser.add_argument("--changed-courses", type=int, nargs="+", default=[], metavar="COURSE_ID",
+                        help="re-allocate incrementally after these courses changed capacity")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="also save the run as a columnar snapshot for analytics and the dashboard")
+    parser.add_argument("--profile", metavar="PATH", help="run under cProfile and dump the stats to this file")
+    args = parser.parse_args(argv)
+    with profile_to(args.profile):
+        if args.changed_students or args.changed_courses:
+            reallocate_incremental(args.changed_students, args.changed_courses, snapshot=args.snapshot)
+        else:
+            allocate_courses(engine=args.engine, snapshot=args.snapshot, courses_per_student=args.courses_per_student,
+                             shard_by=args.shard_by, workers=args.workers)
 
 if __name__ == '__main__':
-    allocate_courses()
\ No newline at end of file
+    main()
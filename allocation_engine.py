@@ -0,0 +1,407 @@
+import heapq
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# AllocationData arrays that share_allocation_data() places in shared memory.
+SHARED_FIELDS = ["student_ids", "cgpa", "course_ids", "capacity", "pref_student", "pref_course", "pref_rank"]
+
+
+class AllocationData:
+    """
+    Compact, array-based view of Students, Courses and Preferences.
+
+    Students and courses are addressed by dense indexes into `student_ids` and
+    `course_ids`; preferences reference those indexes so the allocation passes
+    never have to look anything up by id.
+    """
+
+    def __init__(self, student_ids, cgpa, course_ids, capacity, pref_student, pref_course, pref_rank,
+                 course_names=None):
+        self.student_ids = student_ids
+        self.cgpa = cgpa
+        self.course_ids = course_ids
+        self.capacity = capacity
+        self.pref_student = pref_student
+        self.pref_course = pref_course
+        self.pref_rank = pref_rank
+        self.course_names = course_names
+
+        # Students are ordered by CGPA exactly once. Priority 0 is the strongest
+        # student; ties are broken by student_id, like the SQL path.
+        order = np.lexsort((student_ids, -cgpa))
+        self.priority = np.empty(len(student_ids), dtype=np.int32)
+        self.priority[order] = np.arange(len(student_ids), dtype=np.int32)
+
+    @property
+    def num_students(self):
+        return len(self.student_ids)
+
+    @property
+    def num_courses(self):
+        return len(self.course_ids)
+
+    @classmethod
+    def from_rows(cls, student_rows, course_rows, preference_rows, course_names=None):
+        """
+        Builds the arrays from (student_id, cgpa), (course_id, max_capacity)
+        and (student_id, course_id, preference_rank) rows. `course_names` is an
+        optional {course_id: course_name} mapping used for reporting.
+        """
+        students = np.array(student_rows, dtype=np.float64).reshape(-1, 2)
+        courses = np.array(course_rows, dtype=np.int64).reshape(-1, 2)
+        preferences = np.array(preference_rows, dtype=np.int64).reshape(-1, 3)
+
+        student_order = np.argsort(students[:, 0], kind='stable')
+        student_ids = students[student_order, 0].astype(np.int32)
+        cgpa = students[student_order, 1].astype(np.float32)
+
+        course_order = np.argsort(courses[:, 0], kind='stable')
+        course_ids = courses[course_order, 0].astype(np.int32)
+        capacity = courses[course_order, 1].astype(np.int32)
+
+        pref_student = np.searchsorted(student_ids, preferences[:, 0]).astype(np.int32)
+        pref_course = np.searchsorted(course_ids, preferences[:, 1]).astype(np.int32)
+        pref_rank = preferences[:, 2].astype(np.int16)
+
+        names = None
+        if course_names is not None:
+            names = np.array([course_names[course_id] for course_id in course_ids.tolist()], dtype=object)
+
+        return cls(student_ids, cgpa, course_ids, capacity, pref_student, pref_course, pref_rank, names)
+
+    def index_students(self, student_ids):
+        """Maps student ids to dense indexes, dropping ids that are not loaded."""
+        return _dense_index(self.student_ids, student_ids)
+
+    def index_courses(self, course_ids):
+        """Maps course ids to dense indexes, dropping ids that are not loaded."""
+        return _dense_index(self.course_ids, course_ids)
+
+
+def _dense_index(sorted_ids, ids):
+    ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+    index = np.searchsorted(sorted_ids, ids)
+    found = index < len(sorted_ids)
+    found[found] = sorted_ids[index[found]] == ids[found]
+    return index[found].astype(np.int32)
+
+
+# Shared segments attached by this process, kept open while it runs.
+_worker_segments = []
+
+
+def share_allocation_data(data):
+    """
+    Copies the AllocationData arrays into shared memory segments. Returns the
+    segments (the caller must close and unlink them) and a picklable spec that
+    workers use to attach.
+    """
+    segments, spec = [], {}
+    for name in SHARED_FIELDS:
+        array = getattr(data, name)
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+        segments.append(segment)
+        spec[name] = (segment.name, array.shape, array.dtype.str)
+    course_names = None if data.course_names is None else list(data.course_names)
+    return segments, (spec, course_names)
+
+
+def attach_allocation_data(shared_spec):
+    """
+    Builds an AllocationData on top of the shared segments. The segments stay
+    open for the rest of the process.
+    """
+    spec, course_names = shared_spec
+    arrays = {}
+    for name, (segment_name, shape, dtype) in spec.items():
+        segment = shared_memory.SharedMemory(name=segment_name)
+        _worker_segments.append(segment)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+    names = None if course_names is None else np.array(course_names, dtype=object)
+    return AllocationData(course_names=names, **arrays)
+
+
+def load_allocation_data(connection):
+    """Reads Students, Courses and Preferences once and returns an AllocationData."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT student_id, cgpa FROM Students;")
+        student_rows = cursor.fetchall()
+        cursor.execute("SELECT course_id, max_capacity, course_name FROM Courses;")
+        course_rows = cursor.fetchall()
+        cursor.execute("SELECT student_id, course_id, preference_rank FROM Preferences;")
+        preference_rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    return AllocationData.from_rows(
+        [(student_id, float(cgpa)) for student_id, cgpa in student_rows],
+        [(course_id, capacity) for course_id, capacity, _ in course_rows],
+        preference_rows,
+        course_names={course_id: name for course_id, _, name in course_rows},
+    )
+
+
+def allocate(data):
+    """
+    Runs the rank-by-rank allocation in memory.
+
+    For every preference rank, each course that still has seats admits the
+    highest-CGPA students who are still unallocated and listed it at that rank,
+    up to its residual capacity.
+
+    Returns (student_index, course_index, preference_rank) arrays for every
+    allocation, grouped by preference rank.
+    """
+    return allocate_passes(data, np.zeros(data.num_students, dtype=bool))
+
+
+def allocate_passes(data, allocated, rank_values=None, after_rank=None):
+    """
+    The rank passes behind allocate(), for callers that share state between
+    processes (see sharding.py).
+
+    `allocated` flags students who already hold a seat and is updated in place.
+    `rank_values` fixes the ranks to run, including ranks with no preferences
+    in `data`, and `after_rank` is called after every pass.
+    """
+    # One sort puts every preference in (rank, course, priority) order; each
+    # rank pass is then a contiguous slice that is already grouped by course.
+    order = np.lexsort((data.priority[data.pref_student], data.pref_course, data.pref_rank))
+    ranks = data.pref_rank[order]
+    students = data.pref_student[order]
+    courses = data.pref_course[order]
+
+    residual = data.capacity.astype(np.int32, copy=True)
+    if rank_values is None:
+        rank_values = np.unique(ranks)
+    rank_starts = np.searchsorted(ranks, rank_values, side='left')
+    rank_ends = np.searchsorted(ranks, rank_values, side='right')
+
+    result_students, result_courses, result_ranks = [], [], []
+    for rank, start, end in zip(rank_values, rank_starts, rank_ends):
+        pass_students = students[start:end]
+        pass_courses = courses[start:end]
+
+        # Only unallocated students applying to courses with seats left compete.
+        candidates = ~allocated[pass_students] & (residual[pass_courses] > 0)
+        pass_students = pass_students[candidates]
+        pass_courses = pass_courses[candidates]
+
+        # Position of each candidate in its course's CGPA-ordered queue.
+        group_starts = np.searchsorted(pass_courses, pass_courses, side='left')
+        position = np.arange(len(pass_courses)) - group_starts
+        admitted = position < residual[pass_courses]
+
+        admitted_students = pass_students[admitted]
+        admitted_courses = pass_courses[admitted]
+        allocated[admitted_students] = True
+        residual -= np.bincount(admitted_courses, minlength=data.num_courses).astype(np.int32)
+
+        result_students.append(admitted_students)
+        result_courses.append(admitted_courses)
+        result_ranks.append(np.full(len(admitted_students), rank, dtype=np.int16))
+        if after_rank is not None:
+            after_rank()
+
+    if not result_students:
+        empty = np.empty(0, dtype=np.int32)
+        return empty, empty, np.empty(0, dtype=np.int16)
+
+    return np.concatenate(result_students), np.concatenate(result_courses), np.concatenate(result_ranks)
+
+
+def deferred_acceptance(data, courses_per_student=1):
+    """
+    Runs student-proposing deferred acceptance (Gale-Shapley) in memory.
+
+    Every student with an open seat proposes to their next-ranked course. Each
+    course tentatively holds its best applicants in a min-heap keyed by
+    priority, whose root is the weakest student held. A proposal from a
+    stronger student to a full course bumps that root, and the bumped student
+    proposes again further down their own list. The result is the stable
+    matching that is best for every student: no student loses a course to a
+    lower-CGPA student who ranked it lower, which the rank passes allow.
+
+    Each preference is proposed at most once and each proposal costs one heap
+    operation, so the run takes O(preferences * log capacity). With
+    `courses_per_student` above 1 a student keeps proposing until they hold
+    that many courses or run out of preferences.
+
+    Returns (student_index, course_index, preference_rank) arrays, like
+    allocate(), grouped by preference rank.
+    """
+    # Each student's preferences, in rank order, as one contiguous run.
+    order = np.lexsort((data.pref_rank, data.pref_student))
+    pref_course = data.pref_course[order].tolist()
+    pref_starts = np.searchsorted(data.pref_student[order], np.arange(data.num_students + 1)).tolist()
+
+    next_preference = pref_starts[:-1]
+    capacity = data.capacity.tolist()
+    # Heap keys are negated priorities, so the weakest student held is the root.
+    key = (-data.priority).tolist()
+    held = [[] for _ in range(data.num_courses)]
+
+    # One entry per open seat; a bumped student's seat goes back on the stack.
+    proposers = [student for student in range(data.num_students)
+                 if pref_starts[student] < pref_starts[student + 1]] * courses_per_student
+    while proposers:
+        student = proposers.pop()
+        end = pref_starts[student + 1]
+        while next_preference[student] < end:
+            position = next_preference[student]
+            next_preference[student] = position + 1
+            course = pref_course[position]
+            heap = held[course]
+            if len(heap) < capacity[course]:
+                heapq.heappush(heap, (key[student], student, position))
+                break
+            if heap and key[student] > heap[0][0]:
+                _, bumped, _ = heapq.heapreplace(heap, (key[student], student, position))
+                proposers.append(bumped)
+                break
+
+    positions = np.array([position for heap in held for _, _, position in heap], dtype=np.int64)
+    students = data.pref_student[order][positions]
+    courses = data.pref_course[order][positions]
+    ranks = data.pref_rank[order][positions].astype(np.int16)
+
+    grouped = np.lexsort((data.priority[students], courses, ranks))
+    return students[grouped].astype(np.int32), courses[grouped].astype(np.int32), ranks[grouped]
+
+
+def reallocate_displaced(data, held_course, held_rank, changed_students=(), changed_courses=()):
+    """
+    Updates a rank-pass allocation after a changeset by following the chain of
+    displaced students instead of running every pass again.
+
+    The rank passes admit exactly the students that one scan over every
+    preference in (rank, priority) order would: a student gets a course if
+    they hold nothing yet and the course has a seat left. A preference can
+    only be decided differently from the previous run once its student or its
+    course has changed, so the scan is replayed only from the changed students
+    (their old and new preferences) and the changed courses. Whenever a
+    decision flips, the student's later preferences and the course's later
+    applicants are queued too: a bumped student moves on to their next choice,
+    a freed or newly taken seat is offered to or taken from the course's next
+    applicants until the count is back to the previous run's, and so on.
+
+    `held_course` and `held_rank` give the course index and rank each student
+    holds (-1 and 0 for none), as the rank passes left them before the change;
+    `data` already holds the changed Preferences and capacities. Returns the
+    (student_index, course_index, preference_rank) arrays of every student
+    whose allocation changed, with course -1 for students left without one,
+    and the number of preferences re-evaluated.
+    """
+    num_students = data.num_students
+    # Scan position of every preference; unique per (student, rank).
+    point = data.pref_rank.astype(np.int64) * num_students + data.priority[data.pref_student]
+
+    by_student = np.lexsort((data.pref_rank, data.pref_student))
+    student_starts = np.searchsorted(data.pref_student[by_student], np.arange(num_students + 1))
+    by_course = np.lexsort((point, data.pref_course))
+    course_starts = np.searchsorted(data.pref_course[by_course], np.arange(data.num_courses + 1))
+    course_points = point[by_course]
+
+    # Scan positions of the previous run's admissions, grouped by course.
+    holders = np.flatnonzero(held_course >= 0)
+    held_points = held_rank[holders].astype(np.int64) * num_students + data.priority[holders]
+    held_order = np.lexsort((held_points, held_course[holders]))
+    held_points = held_points[held_order]
+    held_students = holders[held_order]
+    held_starts = np.searchsorted(held_course[holders][held_order], np.arange(data.num_courses + 1))
+
+    # Min-heap of (point, course, student, rank, listed) preferences to replay.
+    queue = []
+    queued = set()
+
+    def push(points, courses, students, ranks, listed=True):
+        for entry in zip(points, courses, students, ranks):
+            if entry[:2] not in queued:
+                queued.add(entry[:2])
+                heapq.heappush(queue, entry + (listed,))
+
+    def push_student(student, after_rank):
+        preferences = by_student[student_starts[student]:student_starts[student + 1]]
+        preferences = preferences[data.pref_rank[preferences] > after_rank]
+        push(point[preferences].tolist(), data.pref_course[preferences].tolist(),
+             data.pref_student[preferences].tolist(), data.pref_rank[preferences].tolist())
+
+    def push_next_applicant(course, after_point):
+        start, end = course_starts[course], course_starts[course + 1]
+        position = start + np.searchsorted(course_points[start:end], after_point, side='right')
+        if position < end:
+            preference = by_course[position]
+            push([int(point[preference])], [course], [int(data.pref_student[preference])],
+                 [int(data.pref_rank[preference])])
+
+    def push_next_holder(course, after_point):
+        start, end = held_starts[course], held_starts[course + 1]
+        position = start + np.searchsorted(held_points[start:end], after_point, side='right')
+        if position < end:
+            student = int(held_students[position])
+            push([int(held_points[position])], [course], [student], [int(held_rank[student])])
+
+    for student in np.asarray(changed_students, dtype=np.int64).tolist():
+        push_student(student, -1)
+        if held_course[student] >= 0:
+            rank = int(held_rank[student])
+            # The old admission is replayed even if the preference is gone.
+            push([rank * num_students + int(data.priority[student])], [int(held_course[student])],
+                 [student], [rank], listed=False)
+
+    changed_courses = set(np.asarray(changed_courses, dtype=np.int64).tolist())
+    for course in changed_courses:
+        push_next_applicant(course, -1)
+
+    held = {}
+    taken_delta = {}
+    evaluated = 0
+    while queue:
+        position, course, student, rank, listed = heapq.heappop(queue)
+        evaluated += 1
+        if not listed:
+            # A replayed old admission still counts if the student kept it at that rank.
+            preferences = by_student[student_starts[student]:student_starts[student + 1]]
+            listed = bool(((data.pref_course[preferences] == course) & (data.pref_rank[preferences] == rank)).any())
+
+        previous = (int(held_course[student]), int(held_rank[student]))
+        current_course, current_rank = held.get(student, previous)
+        taken = int(np.searchsorted(held_points[held_starts[course]:held_starts[course + 1]], position))
+        taken += taken_delta.get(course, 0)
+        admitted = (listed and not (current_course >= 0 and current_rank < rank)
+                    and taken < data.capacity[course])
+        if admitted != (previous == (course, rank)):
+            taken_delta[course] = taken_delta.get(course, 0) + (1 if admitted else -1)
+            if admitted:
+                held[student] = (course, rank)
+            elif (current_course, current_rank) == (course, rank):
+                held[student] = (-1, 0)
+            push_student(student, rank)
+
+        # While the course has fewer seats taken than before (or a new
+        # capacity), its next applicant may get in. While it has more, only its
+        # next previous admission can be bumped.
+        if taken_delta.get(course, 0) < 0 or course in changed_courses:
+            push_next_applicant(course, position)
+        elif taken_delta.get(course, 0) > 0:
+            push_next_holder(course, position)
+
+    changed = [(student, course, rank) for student, (course, rank) in held.items()
+               if (course, rank) != (held_course[student], held_rank[student])]
+    columns = np.array(changed, dtype=np.int64).reshape(-1, 3)
+    return columns[:, 0].astype(np.int32), columns[:, 1].astype(np.int32), columns[:, 2].astype(np.int16), evaluated
+
+
+def allocation_rows(data, student_index, course_index, ranks=None):
+    """
+    Converts dense allocation indexes back to (student_id, course_id) rows, or
+    (student_id, course_id, preference_rank) rows when `ranks` is given. The
+    rows are produced lazily, so a writer can stream them in batches.
+    """
+    columns = [data.student_ids[student_index].tolist(), data.course_ids[course_index].tolist()]
+    if ranks is not None:
+        columns.append(ranks.tolist())
+    return zip(*columns)
@@ -0,0 +1,146 @@
+from dataclasses import dataclass, field
+
+# One grouped pass over Courses, Preferences and Allocation_Results at
+# (course, preference rank) grain; every metric is aggregated from its rows.
+METRICS_QUERY = """
+    SELECT
+        c.course_id,
+        c.course_name,
+        c.max_capacity,
+        p.preference_rank,
+        COUNT(p.student_id) AS preferences,
+        COUNT(ar.student_id) AS allocated,
+        (SELECT COUNT(*) FROM Students) AS total_students,
+        (SELECT COUNT(DISTINCT student_id) FROM Allocation_Results) AS allocated_students
+    FROM Courses c
+    LEFT JOIN Preferences p ON p.course_id = c.course_id
+    LEFT JOIN Allocation_Results ar ON ar.student_id = p.student_id AND ar.course_id = p.course_id
+    GROUP BY c.course_id, c.course_name, c.max_capacity, p.preference_rank;
+"""
+
+
+@dataclass
+class AllocationMetrics:
+    """
+    Key allocation outcomes for one run. allocated_count counts students, so
+    with several courses per student it is below the sum of allocations_by_rank.
+    """
+
+    total_students: int
+    allocated_count: int
+    allocations_by_rank: dict = field(default_factory=dict)
+    vacancies: list = field(default_factory=list)
+    oversubscribed: list = field(default_factory=list)
+
+    @property
+    def unallocated_count(self):
+        return self.total_students - self.allocated_count
+
+    @property
+    def first_choice_rate(self):
+        """Share of allocated students who got their first choice, in percent."""
+        if not self.allocated_count:
+            return 0.0
+        return round(self.allocations_by_rank.get(1, 0) / self.allocated_count * 100, 2)
+
+    def as_dict(self):
+        """Returns the metrics as plain JSON-serializable values."""
+        return {
+            "total_students": self.total_students,
+            "allocated_count": self.allocated_count,
+            "unallocated_count": self.unallocated_count,
+            "first_choice_rate": self.first_choice_rate,
+            "allocations_by_rank": {str(rank): count for rank, count in self.allocations_by_rank.items()},
+            "vacancies": [{"course_name": course, "remaining_seats": seats} for course, seats in self.vacancies],
+            "oversubscribed": [{"course_name": course, "demand": demand, "capacity": capacity}
+                               for course, demand, capacity in self.oversubscribed],
+        }
+
+    def print_report(self):
+        """Prints the metrics in the allocator's usual report format."""
+        print(f"Total students allocated: {self.allocated_count}")
+        for rank, count in sorted(self.allocations_by_rank.items()):
+            print(f"Students who received their {ordinal(rank)} choice: {count}")
+        print(f"Total students: {self.total_students}")
+        print(f"Total unallocated students: {self.unallocated_count}")
+
+        print("\nCourses with Remaining Seats:")
+        for course, seats in self.vacancies:
+            print(f"- {course}: {seats} seats")
+
+        print("\nOversubscribed Courses (Demand > Capacity):")
+        for course, demand, capacity in self.oversubscribed:
+            print(f"- {course}: Demand={demand}, Capacity={capacity}")
+
+
+def ordinal(number):
+    if 10 <= number % 100 <= 20:
+        suffix = "th"
+    else:
+        suffix = {1: "st", 2: "nd", 3: "rd"}.get(number % 10, "th")
+    return f"{number}{suffix}"
+
+
+def metrics_from_rows(rows):
+    """
+    Builds AllocationMetrics from METRICS_QUERY rows of
+    (course_id, course_name, max_capacity, preference_rank, preferences, allocated, total_students,
+    allocated_students).
+    """
+    total_students = 0
+    allocated_count = 0
+    allocations_by_rank = {}
+    courses = {}
+    for course_id, course_name, capacity, rank, preferences, allocated, students, allocated_students in rows:
+        total_students = int(students)
+        allocated_count = int(allocated_students)
+        course = courses.setdefault(course_id, [course_name, int(capacity), 0, 0])
+        course[2] += int(preferences)
+        course[3] += int(allocated)
+        if rank is not None and allocated:
+            allocations_by_rank[int(rank)] = allocations_by_rank.get(int(rank), 0) + int(allocated)
+
+    return _build_metrics(total_students, allocated_count, allocations_by_rank, [
+        (course_id, name, capacity, demand, allocated)
+        for course_id, (name, capacity, demand, allocated) in courses.items()
+    ])
+
+
+def metrics_from_allocation(data, student_index, course_index, ranks):
+    """
+    Builds AllocationMetrics straight from an in-memory allocation, without
+    touching the database.
+    """
+    import numpy as np
+
+    demand = np.bincount(data.pref_course, minlength=data.num_courses)
+    allocated = np.bincount(course_index, minlength=data.num_courses)
+    rank_values, rank_counts = np.unique(ranks, return_counts=True)
+
+    names = data.course_names if data.course_names is not None else data.course_ids.astype(str)
+    return _build_metrics(
+        data.num_students,
+        len(np.unique(student_index)),
+        {int(rank): int(count) for rank, count in zip(rank_values, rank_counts)},
+        list(zip(data.course_ids.tolist(), list(names), data.capacity.tolist(), demand.tolist(), allocated.tolist())),
+    )
+
+
+def _build_metrics(total_students, allocated_count, allocations_by_rank, courses):
+    # courses: (course_id, course_name, capacity, demand, allocated)
+    courses = sorted(courses)
+    vacancies = sorted(
+        ((name, capacity - allocated) for _, name, capacity, _, allocated in courses if capacity > allocated),
+        key=lambda course: -course[1],
+    )
+    oversubscribed = sorted(
+        ((name, demand, capacity) for _, name, capacity, demand, _ in courses if demand > capacity),
+        key=lambda course: -course[1],
+    )
+    return AllocationMetrics(
+        total_students=total_students,
+        allocated_count=allocated_count,
+        allocations_by_rank=dict(sorted(allocations_by_rank.items())),
+        vacancies=vacancies,
+        oversubscribed=oversubscribed,
+    )
@@ -1,71 +1,221 @@
-import mysql.connector
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
 import pandas as pd
-from mysql.connector import Error
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# Replace with your MySQL details
-MYSQL_HOST = "localhost"
-MYSQL_USER = "root"
-MYSQL_PASSWORD = "password"
-MYSQL_DB = "course_allocator_db"
-
-def get_data(query):
-    """Connects to MySQL and returns data as a pandas DataFrame."""
-    conn = None
-    try:
-        conn = mysql.connector.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            passwd=MYSQL_PASSWORD,
-            database=MYSQL_DB
-        )
-        print("Connection successful for data retrieval.")
-        df = pd.read_sql(query, conn)
-        return df
-    except Error as err:
-        print(f"Error: '{err}'")
-        return None
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
-
-def run_analytics():
-    """Main function to run all analytics and generate reports."""
-    
+from allocation_metrics import ordinal
+from db import fetch_typed_frames
+from fairness import (CGPA_GROUPS, DEFAULT_BOOTSTRAP_SAMPLES, DEFAULT_CONFIDENCE, MEASURES, envy_totals,
+                      student_outcomes, summarize, summary_to_dict)
+from instrumentation import load_trace, stage_seconds
+
+# Only the columns the analysis uses, in compact dtypes. Snapshots are already
+# stored this way.
+ANALYTICS_TABLES = [
+    ("students", "SELECT student_id, cgpa, major FROM Students;",
+     {"student_id": "int32", "cgpa": "float32", "major": "category"}),
+    ("courses", "SELECT course_id, course_name, department, max_capacity FROM Courses;",
+     {"course_id": "int32", "course_name": "category", "department": "category", "max_capacity": "int32"}),
+    ("preferences", "SELECT student_id, course_id, preference_rank FROM Preferences;",
+     {"student_id": "int32", "course_id": "int32", "preference_rank": "int16"}),
+    ("allocation_results", "SELECT student_id, course_id FROM Allocation_Results;",
+     {"student_id": "int32", "course_id": "int32"}),
+]
+
+def load_analytics_frames(snapshot=None):
+    """
+    Returns the Students, Courses, Preferences and Allocation_Results frames,
+    from a snapshot (a run id or "latest") or the database, or None on error.
+    """
+    if snapshot is not None:
+        # pyarrow is only imported when a snapshot is read.
+        from snapshots import load_snapshot
+
+        tables = [table for table, _, _ in ANALYTICS_TABLES]
+        snapshot_frames = load_snapshot(None if snapshot == "latest" else int(snapshot), tables)
+        return [snapshot_frames[table] for table in tables] if snapshot_frames else None
+
+    return fetch_typed_frames(*[(query, dtypes) for _, query, dtypes in ANALYTICS_TABLES])
+
+def pair_keys(df):
+    """Packs each row's (student_id, course_id) into a single int64 key."""
+    return (df['student_id'].to_numpy(np.int64) << 32) | df['course_id'].to_numpy(np.int64)
+
+# --- Charts ---
+# Each chart is a (file name, chart kind, data, figure size) tuple, so it can be
+# shown interactively or shipped to a worker process and saved to a file.
+
+def plot_demand_ratio(ax, data):
+    sns.barplot(x='course_name', y='demand_ratio', data=data, ax=ax)
+    ax.set_title('Top 10 Courses by Demand-to-Capacity Ratio')
+    ax.set_ylabel('Demand/Capacity Ratio')
+    ax.set_xlabel('Course Name')
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+
+def plot_success_by_major(ax, data):
+    sns.barplot(x='major', y='allocated', data=data, ax=ax)
+    ax.set_title('1st Preference Allocation Success Rate by Major')
+    ax.set_ylabel('Success Rate (%)')
+    ax.set_xlabel('Major')
+    plt.setp(ax.get_xticklabels(), rotation=45)
+
+def plot_allocations_by_rank(ax, data):
+    sns.barplot(x='preference_rank', y='students', data=data, ax=ax)
+    ax.set_title('Allocations by Preference Rank')
+    ax.set_ylabel('Students Allocated')
+    ax.set_xlabel('Preference Rank')
+
+def plot_department(ax, data):
+    long_df = data.melt(id_vars='course_name', value_vars=['max_capacity', 'total_preferences', 'allocated'],
+                        var_name='measure', value_name='students')
+    sns.barplot(x='course_name', y='students', hue='measure', data=long_df, ax=ax)
+    ax.set_title(f"{data['department'].iloc[0]}: Capacity, Demand and Allocations by Course")
+    ax.set_ylabel('Students')
+    ax.set_xlabel('Course Name')
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+
+def plot_stage_timings(ax, data):
+    data.plot(kind='bar', stacked=True, ax=ax)
+    ax.set_title('Allocation Run Time by Stage')
+    ax.set_ylabel('Seconds')
+    ax.set_xlabel('Run')
+    ax.legend(title='Stage', bbox_to_anchor=(1.02, 1), loc='upper left')
+
+def plot_cgpa_deciles(ax, data):
+    for measure, rows in data.groupby('measure', sort=False):
+        ax.plot(rows['group'], rows['mean'] * 100, marker='o', label=MEASURES[measure])
+        ax.fill_between(rows['group'], rows['low'] * 100, rows['high'] * 100, alpha=0.2)
+    ax.set_title(f'Outcomes by CGPA Decile ({DEFAULT_CONFIDENCE:.0%} bootstrap intervals)')
+    ax.set_ylabel('Students (%) / Mean Satisfaction (%)')
+    ax.set_xlabel('CGPA Decile (10 = highest)')
+    ax.set_xticks(range(1, CGPA_GROUPS + 1))
+    ax.legend()
+
+def plot_satisfaction_by_major(ax, data):
+    ax.bar(data['group'], data['mean'], yerr=[data['mean'] - data['low'], data['high'] - data['mean']], capsize=4)
+    ax.set_title(f'Rank-Weighted Satisfaction by Major ({DEFAULT_CONFIDENCE:.0%} bootstrap intervals)')
+    ax.set_ylabel('Mean Satisfaction (1 = first choice)')
+    ax.set_xlabel('Major')
+    plt.setp(ax.get_xticklabels(), rotation=45)
+
+CHART_KINDS = {
+    "demand_ratio": plot_demand_ratio,
+    "success_by_major": plot_success_by_major,
+    "allocations_by_rank": plot_allocations_by_rank,
+    "department": plot_department,
+    "stage_timings": plot_stage_timings,
+    "cgpa_deciles": plot_cgpa_deciles,
+    "satisfaction_by_major": plot_satisfaction_by_major,
+}
+
+def draw_chart(chart):
+    """Draws one chart on a new figure and returns the figure."""
+    _, kind, data, figsize = chart
+    fig, ax = plt.subplots(figsize=figsize)
+    CHART_KINDS[kind](ax, data)
+    fig.tight_layout()
+    return fig
+
+def use_headless_backend():
+    """Pool initializer: render with Agg, which needs no display."""
+    plt.switch_backend('Agg')
+
+def save_chart(chart, output_dir, formats):
+    """Draws one chart and saves it once per format. Returns the written paths."""
+    fig = draw_chart(chart)
+    paths = []
+    for extension in formats:
+        path = os.path.join(output_dir, f"{chart[0]}.{extension}")
+        fig.savefig(path)
+        paths.append(path)
+    plt.close(fig)
+    return paths
+
+def write_report(charts, metrics, output_dir, formats=("png",), workers=None):
+    """
+    Renders every chart to files in parallel across a process pool and writes
+    the metrics (plus the chart paths) to metrics.json in `output_dir`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=use_headless_backend) as executor:
+        futures = [executor.submit(save_chart, chart, output_dir, formats) for chart in charts]
+        metrics["charts"] = [path for future in futures for path in future.result()]
+
+    metrics_path = os.path.join(output_dir, "metrics.json")
+    with open(metrics_path, "w") as handle:
+        json.dump(metrics, handle, indent=2)
+    return metrics_path
+
+def run_analytics(snapshot=None, output_dir=None, formats=("png",), workers=None, trace=None,
+                  bootstrap_samples=DEFAULT_BOOTSTRAP_SAMPLES):
+    """
+    Main function to run all analytics and generate reports.
+
+    By default the data is read from the database. Pass a run id, or "latest",
+    as `snapshot` to load a columnar snapshot written by allocate_courses.py
+    instead.
+
+    Charts are shown interactively unless `output_dir` is given. In that case
+    nothing is shown: every chart is saved there in each of `formats` by a
+    pool of `workers` processes, next to a metrics.json summary. Returns the
+    metrics dict.
+
+    If a stage trace exists (`trace`, or ALLOCATOR_TRACE), the time each run
+    spent in every stage is charted and added to the metrics.
+
+    The fairness section reports rank-weighted satisfaction, CGPA-decile
+    curves and justified envy with `bootstrap_samples`-sample confidence
+    intervals (see fairness.py).
+    """
+    started = time.perf_counter()
+
     # 1. Load all necessary data into DataFrames
-    students_df = get_data("SELECT * FROM Students;")
-    courses_df = get_data("SELECT * FROM Courses;")
-    preferences_df = get_data("SELECT * FROM Preferences;")
-    allocation_df = get_data("SELECT * FROM Allocation_Results;")
-    
-    if any(df is None for df in [students_df, courses_df, preferences_df, allocation_df]):
-        print("Failed to load all data from the database. Please check your connection.")
+    frames = load_analytics_frames(snapshot)
+
+    if frames is None:
+        if snapshot is not None:
+            print(f"No snapshot found for run '{snapshot}'.")
+        else:
+            print("Failed to load all data from the database. Please check your connection.")
         return
 
+    students_df, courses_df, preferences_df, allocation_df = frames
+
     print("\nData loaded successfully.")
 
+    # Flag every preference that was allocated with one keyed lookup of the
+    # allocations into Preferences (each (student_id, course_id) pair is unique).
+    positions = pd.Index(pair_keys(preferences_df)).get_indexer(pair_keys(allocation_df))
+    allocated = np.zeros(len(preferences_df), dtype=bool)
+    allocated[positions[positions >= 0]] = True
+    ranks = preferences_df['preference_rank'].to_numpy()
+
     # 2. Key Metrics & Allocation Outcomes
     print("\n--- Key Allocation Metrics ---")
     total_students = len(students_df)
-    total_allocated = len(allocation_df['student_id'].unique())
-    first_choice_count = len(pd.merge(allocation_df, preferences_df[preferences_df['preference_rank'] == 1], on=['student_id', 'course_id']))
-    second_choice_count = len(pd.merge(allocation_df, preferences_df[preferences_df['preference_rank'] == 2], on=['student_id', 'course_id']))
-    third_choice_count = len(pd.merge(allocation_df, preferences_df[preferences_df['preference_rank'] == 3], on=['student_id', 'course_id']))
-    
+    total_allocated = allocation_df['student_id'].nunique()
+    rank_counts = pd.Series(ranks[allocated]).value_counts()
+    all_ranks = np.unique(ranks).tolist()
+
     print(f"Total Students: {total_students}")
     print(f"Total Allocated: {total_allocated}")
     print(f"Unallocated Students: {total_students - total_allocated}")
-    print(f"Students with 1st Choice: {first_choice_count}")
-    print(f"Students with 2nd Choice: {second_choice_count}")
-    print(f"Students with 3rd Choice: {third_choice_count}")
+    for rank in all_ranks:
+        print(f"Students with {ordinal(rank)} Choice: {rank_counts.get(rank, 0)}")
 
     # --- 3. Demand vs. Capacity Analysis ---
     print("\n--- Demand vs. Capacity Analysis ---")
-    
+
     # Calculate total preference count for each course
     demand_df = preferences_df.groupby('course_id').size().reset_index(name='total_preferences')
-    
+
     # Merge with course capacity data
     demand_supply_df = pd.merge(demand_df, courses_df, on='course_id')
     demand_supply_df['demand_ratio'] = demand_supply_df['total_preferences'] / demand_supply_df['max_capacity']
@@ -73,40 +223,119 @@ def run_analytics():
 
     print("\nTop 5 Most Oversubscribed Courses (by Preference Ratio):")
     print(demand_supply_df[['course_name', 'total_preferences', 'max_capacity', 'demand_ratio']].head(5).to_string(index=False))
-    
-    # Visualization: Demand vs Capacity
-    plt.figure(figsize=(12, 7))
-    sns.barplot(x='course_name', y='demand_ratio', data=demand_supply_df.head(10))
-    plt.title('Top 10 Courses by Demand-to-Capacity Ratio')
-    plt.ylabel('Demand/Capacity Ratio')
-    plt.xlabel('Course Name')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    plt.show()
 
     # --- 4. Fairness and CGPA Bias Analysis ---
     print("\n--- Fairness and CGPA Bias Analysis ---")
-    
-    # Merge all data for a comprehensive view
-    full_df = pd.merge(preferences_df, students_df, on='student_id')
-    full_df = pd.merge(full_df, allocation_df, on=['student_id', 'course_id'], how='left', suffixes=('_pref', '_alloc'))
-    full_df['allocated'] = full_df['allocation_id'].notna()
+
+    # Look up each first choice's student major by position instead of merging
+    first_choice = ranks == 1
+    majors = students_df['major'].astype('category')
+    student_positions = pd.Index(students_df['student_id']).get_indexer(preferences_df['student_id'].to_numpy()[first_choice])
+    first_choice_df = pd.DataFrame({
+        'major': pd.Categorical.from_codes(majors.cat.codes.to_numpy()[student_positions], majors.cat.categories),
+        'allocated': allocated[first_choice],
+    })
 
     # Analyze allocation success by major
-    success_by_major = full_df[full_df['preference_rank'] == 1].groupby('major')['allocated'].mean().reset_index()
+    success_by_major = first_choice_df.groupby('major', observed=True)['allocated'].mean().reset_index()
     success_by_major['allocated'] = success_by_major['allocated'] * 100
 
     print("\n1st Preference Allocation Success Rate by Major:")
     print(success_by_major.to_string(index=False))
 
-    # Visualization: 1st Preference Success Rate by Major
-    plt.figure(figsize=(10, 6))
-    sns.barplot(x='major', y='allocated', data=success_by_major)
-    plt.title('1st Preference Allocation Success Rate by Major')
-    plt.ylabel('Success Rate (%)')
-    plt.xlabel('Major')
-    plt.xticks(rotation=45)
-    plt.show()
+    # Per-student outcomes, summarized overall, per CGPA decile and per major
+    outcomes_df = student_outcomes(students_df, preferences_df, allocation_df, allocated)
+    overall_df = summarize(outcomes_df, samples=bootstrap_samples)
+    deciles_df = summarize(outcomes_df, 'cgpa_decile', samples=bootstrap_samples)
+    fairness_by_major_df = summarize(outcomes_df, 'major', samples=bootstrap_samples)
+    envy = envy_totals(outcomes_df)
+
+    print(f"\nOutcomes with {DEFAULT_CONFIDENCE:.0%} bootstrap intervals ({bootstrap_samples} samples):")
+    print(overall_df.drop(columns='group').round(4).to_string(index=False))
+    print("\nMean outcome by CGPA decile (10 = highest):")
+    print(deciles_df.pivot(index='group', columns='measure', values='mean').round(3).to_string())
+    print(f"\nEnvy: {envy['envious_students']} students envy {envy['envied_seats']} seats; "
+          f"{envy['students_with_justified_envy']} students have justified envy of "
+          f"{envy['justified_envy_seats']} seats held by lower-CGPA students.")
+
+    # --- 5. Per-course and per-department outcomes ---
+    course_outcomes_df = courses_df.astype({'course_name': str, 'department': str})
+    course_outcomes_df = course_outcomes_df.assign(
+        total_preferences=course_outcomes_df['course_id'].map(demand_df.set_index('course_id')['total_preferences']).fillna(0).astype(int),
+        allocated=course_outcomes_df['course_id'].map(allocation_df['course_id'].value_counts()).fillna(0).astype(int),
+    )
+    course_outcomes_df['demand_ratio'] = course_outcomes_df['total_preferences'] / course_outcomes_df['max_capacity']
+    department_df = course_outcomes_df.groupby('department')[['max_capacity', 'total_preferences', 'allocated']].sum()
+
+    # Chart data uses plain strings so categorical axes only show what is plotted
+    charts = [
+        ("demand_ratio", "demand_ratio", demand_supply_df.head(10).astype({'course_name': str}), (12, 7)),
+        ("success_by_major", "success_by_major", success_by_major.astype({'major': str}), (10, 6)),
+        ("allocations_by_rank", "allocations_by_rank",
+         pd.DataFrame({'preference_rank': all_ranks, 'students': [int(rank_counts.get(rank, 0)) for rank in all_ranks]}), (10, 6)),
+    ]
+    charts.append(("cgpa_deciles", "cgpa_deciles", deciles_df[deciles_df['measure'] != 'justified_envy'], (10, 6)))
+    charts.append(("satisfaction_by_major", "satisfaction_by_major",
+                   fairness_by_major_df[fairness_by_major_df['measure'] == 'satisfaction'].astype({'group': str}), (10, 6)))
+    for department, department_courses in course_outcomes_df.groupby('department'):
+        charts.append((f"department_{department.lower().replace(' ', '_')}", "department", department_courses, (12, 7)))
+
+    # --- 6. Run-over-run performance from the stage trace ---
+    timings_df = stage_seconds(load_trace(trace))
+    if not timings_df.empty:
+        print("\n--- Seconds per Stage (latest runs) ---")
+        print(timings_df.tail(5).round(3).to_string())
+        charts.append(("stage_timings", "stage_timings", timings_df.tail(20), (12, 7)))
+
+    metrics = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": "database" if snapshot is None else f"snapshot:{snapshot}",
+        "total_students": int(total_students),
+        "total_allocated": int(total_allocated),
+        "unallocated_students": int(total_students - total_allocated),
+        "allocations_by_rank": {str(rank): int(rank_counts.get(rank, 0)) for rank in all_ranks},
+        "first_choice_success_rate_by_major": {str(major): round(float(rate), 2) for major, rate in success_by_major.itertuples(index=False)},
+        "fairness": {
+            "bootstrap_samples": bootstrap_samples,
+            "confidence": DEFAULT_CONFIDENCE,
+            "overall": summary_to_dict(overall_df)["all"],
+            "by_cgpa_decile": summary_to_dict(deciles_df),
+            "by_major": summary_to_dict(fairness_by_major_df),
+            "envy": envy,
+        },
+        "departments": {department: {key: int(value) for key, value in row.items()} for department, row in department_df.iterrows()},
+        "courses": course_outcomes_df.round({'demand_ratio': 4}).to_dict('records'),
+        "stage_seconds": {str(run_id): {stage: round(float(seconds), 6) for stage, seconds in row.items()}
+                          for run_id, row in timings_df.iterrows()},
+    }
+
+    if output_dir is None:
+        for chart in charts:
+            draw_chart(chart)
+        plt.show()
+        return metrics
+
+    metrics_path = write_report(charts, metrics, output_dir, formats, workers)
+    print(f"\nReport with {len(charts)} charts written to {output_dir} "
+          f"({metrics_path}) in {time.perf_counter() - started:.2f}s.")
+    return metrics
+
+
+def main(argv=None, prog=None):
+    """Command line entry point; `argv` defaults to sys.argv[1:]."""
+    parser = argparse.ArgumentParser(prog=prog, description="Analyse the allocation results.")
+    parser.add_argument("--snapshot", nargs="?", const="latest", metavar="RUN_ID",
+                        help="read a columnar snapshot (the latest one if no run id is given) instead of the database")
+    parser.add_argument("--output-dir", help="render every chart to files in this directory instead of showing them")
+    parser.add_argument("--formats", nargs="+", choices=["png", "svg"], default=["png"], help="chart file formats")
+    parser.add_argument("--workers", type=int, help="chart rendering processes (default: one per CPU)")
+    parser.add_argument("--trace", help="stage trace written by allocate_courses.py (default: ALLOCATOR_TRACE)")
+    parser.add_argument("--bootstrap-samples", type=int, default=DEFAULT_BOOTSTRAP_SAMPLES,
+                        help="bootstrap samples behind the fairness confidence intervals")
+    args = parser.parse_args(argv)
+    run_analytics(snapshot=args.snapshot, output_dir=args.output_dir, formats=args.formats, workers=args.workers,
+                  trace=args.trace, bootstrap_samples=args.bootstrap_samples)
+
 
 if __name__ == '__main__':
-    run_analytics()
\ No newline at end of file
+    main()
@@ -0,0 +1,215 @@
+"""
+Benchmarks the allocation pipeline at several cohort sizes.
+
+For every scale a synthetic dataset is generated into a scratch SQLite
+database, then each stage runs in its own fresh process so timings and memory
+readings do not leak between stages:
+
+    generate         create_database.populate_synthetic_data()
+    allocate_sql     allocate_courses.allocate_courses(engine="sql")
+    allocate_numpy   allocate_courses.allocate_courses(engine="numpy")
+    metrics          allocate_courses.get_allocation_metrics()
+    analytics        analytics.run_analytics()
+    dashboard        dashboard.load_dashboard_data()
+
+Results are written as JSON so runs can be compared between commits:
+
+    python benchmark.py --scales 1000 10000 --output benchmark_results.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+STAGES = ["generate", "allocate_sql", "allocate_numpy", "metrics", "analytics", "dashboard"]
+DEFAULT_SCALES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def current_rss_bytes():
+    """Returns the current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # ru_maxrss is the peak so far (kilobytes on Linux, bytes on macOS).
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PeakMemorySampler(threading.Thread):
+    """Samples the process RSS in the background and keeps the peak."""
+
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.baseline = current_rss_bytes()
+        self.peak = self.baseline
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            self.peak = max(self.peak, current_rss_bytes())
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        self.peak = max(self.peak, current_rss_bytes())
+
+
+def stage_generate(options):
+    from create_database import create_tables, populate_synthetic_data
+    from db import create_db_connection
+
+    connection = create_db_connection()
+    create_tables(connection)
+    populate_synthetic_data(connection, options["students"], options["courses"], options["ranks"],
+                            options["skew"], options["seed"])
+    connection.close()
+
+
+def stage_allocate_sql(options):
+    from allocate_courses import allocate_courses
+    allocate_courses(engine="sql")
+
+
+def stage_allocate_numpy(options):
+    from allocate_courses import allocate_courses
+    allocate_courses(engine="numpy")
+
+
+def stage_metrics(options):
+    from allocate_courses import get_allocation_metrics
+    from db import create_db_connection
+
+    connection = create_db_connection()
+    get_allocation_metrics(connection)
+    connection.close()
+
+
+def stage_analytics(options):
+    from analytics import run_analytics
+    run_analytics()
+
+
+def stage_dashboard(options):
+    from dashboard import load_dashboard_data
+    load_dashboard_data()
+
+
+STAGE_FUNCTIONS = {
+    "generate": stage_generate,
+    "allocate_sql": stage_allocate_sql,
+    "allocate_numpy": stage_allocate_numpy,
+    "metrics": stage_metrics,
+    "analytics": stage_analytics,
+    "dashboard": stage_dashboard,
+}
+
+# Modules each stage needs, imported before the clock starts.
+STAGE_IMPORTS = {
+    "generate": ["create_database"],
+    "allocate_sql": ["allocate_courses"],
+    "allocate_numpy": ["allocate_courses", "allocation_engine"],
+    "metrics": ["allocate_courses"],
+    "analytics": ["analytics"],
+    "dashboard": ["dashboard"],
+}
+
+
+def run_stage(stage, options, results):
+    """Runs one stage in the current (child) process and reports timing and memory."""
+    warnings.simplefilter("ignore")
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for module in STAGE_IMPORTS[stage]:
+            __import__(module)
+
+        sampler = PeakMemorySampler()
+        sampler.start()
+        started = time.perf_counter()
+        STAGE_FUNCTIONS[stage](options)
+        seconds = time.perf_counter() - started
+        sampler.stop()
+
+    results.put({
+        "seconds": round(seconds, 4),
+        "peak_rss_mb": round(sampler.peak / 2 ** 20, 1),
+        "peak_delta_mb": round((sampler.peak - sampler.baseline) / 2 ** 20, 1),
+    })
+
+
+def run_benchmarks(scales, stages, courses=100, ranks=3, skew=1.0, seed=42):
+    """
+    Runs every stage at every scale against a scratch SQLite database and
+    returns the list of result records.
+    """
+    context = multiprocessing.get_context("spawn")
+    records = []
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ["ALLOCATOR_BACKEND"] = "sqlite"
+        os.environ["ALLOCATOR_SQLITE_PATH"] = os.path.join(scratch, "benchmark.db")
+        os.environ["MPLBACKEND"] = "Agg"
+
+        for students in scales:
+            options = {"students": students, "courses": courses, "ranks": ranks, "skew": skew, "seed": seed}
+            # Every stage after "generate" needs the data it creates, and stages
+            # always run in STAGES order (allocations before metrics and charts)
+            # so the timings compare between commits whatever the command line.
+            for stage in [stage for stage in STAGES if stage == "generate" or stage in stages]:
+                results = context.Queue()
+                process = context.Process(target=run_stage, args=(stage, options, results))
+                process.start()
+                process.join()
+                if process.exitcode != 0:
+                    print(f"{stage} at {students} students failed (exit code {process.exitcode}).")
+                    continue
+                record = {"stage": stage, "students": students, "courses": courses,
+                          "preferences": students * min(ranks, courses), **results.get()}
+                print(f"{stage:>15} {students:>9} students: {record['seconds']:>9.3f}s, "
+                      f"peak {record['peak_rss_mb']:.1f} MB (+{record['peak_delta_mb']:.1f} MB)")
+                if stage in stages:
+                    records.append(record)
+    return records
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark allocation, metrics, analytics and dashboard preparation.")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="student counts to benchmark")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="stages to record")
+    parser.add_argument("--courses", type=int, default=100, help="number of synthetic courses")
+    parser.add_argument("--ranks", type=int, default=3, help="preferences per student")
+    parser.add_argument("--skew", type=float, default=1.0, help="demand skew towards the first courses")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for the synthetic data")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    records = run_benchmarks(args.scales, args.stages, args.courses, args.ranks, args.skew, args.seed)
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {"courses": args.courses, "ranks": args.ranks, "skew": args.skew, "seed": args.seed},
+        "results": records,
+    }
+    with open(args.output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"\nResults written to {args.output}")
@@ -0,0 +1,116 @@
+"""
+Single command line entry point for the course allocator.
+
+    python cli.py generate --students 100000 --seed 1
+    python cli.py allocate --engine numpy
+    python cli.py metrics
+    python cli.py report --output-dir reports/latest
+    python cli.py serve
+    python cli.py live --port 8765
+    python cli.py check-imports
+
+Every command takes the arguments of the script behind it, which
+`python cli.py <command> --help` lists. Only the chosen command's module is
+imported, and the modules import their heavy libraries where they use them, so
+`allocate` (with the SQL engine) and `metrics` start without pandas,
+matplotlib, seaborn, dash, plotly or pyarrow. `check-imports` measures that
+cold start with -X importtime and fails if it regresses.
+"""
+import argparse
+import importlib
+import os
+import re
+import subprocess
+import sys
+
+# command -> (module, entry point, help)
+COMMANDS = {
+    "generate": ("create_database", "main", "create the tables and load sample or synthetic data"),
+    "allocate": ("allocate_courses", "main", "run the course allocation"),
+    "metrics": ("allocate_courses", "metrics_main", "print the metrics of the current allocation"),
+    "report": ("analytics", "main", "analyse the allocation results and render the charts"),
+    "serve": ("dashboard", "main", "launch the interactive dashboard"),
+    "live": ("service", "main", "serve live seat queries, requests and drops"),
+    "scenarios": ("scenarios", "main", "compare what-if capacity scenarios"),
+}
+
+# Commands run from cron, which check-imports keeps fast: they must not import
+# any of HEAVY_MODULES and must finish importing within the budget.
+FAST_COMMANDS = ["allocate", "metrics"]
+HEAVY_MODULES = ["pandas", "matplotlib", "seaborn", "dash", "plotly", "pyarrow"]
+DEFAULT_IMPORT_BUDGET_MS = 200
+
+# "import time: <self us> | <cumulative us> | <indented module name>"
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$", re.MULTILINE)
+
+
+def load_command(command):
+    """Imports the module behind a command and returns its entry point."""
+    module, function, _ = COMMANDS[command]
+    return getattr(importlib.import_module(module), function)
+
+
+def import_profile(command):
+    """
+    Loads a command in a fresh interpreter under -X importtime. Returns the
+    cumulative import time of every top-level import in microseconds, as a
+    {module: microseconds} dict, and the set of all modules imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import cli; cli.load_command({command!r})"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Loading '{command}' failed:\n{result.stderr}")
+    top_level = {}
+    modules = set()
+    for _, cumulative, indent, name in IMPORT_TIME_LINE.findall(result.stderr):
+        modules.add(name)
+        if not indent:
+            top_level[name] = int(cumulative)
+    return top_level, modules
+
+
+def check_import_time(commands=FAST_COMMANDS, budget_ms=DEFAULT_IMPORT_BUDGET_MS):
+    """
+    Reports the cold-start import time of each command and the heavy libraries
+    it pulls in. Returns True if every command stays within `budget_ms` and
+    imports none of HEAVY_MODULES.
+    """
+    all_passed = True
+    for command in commands:
+        top_level, modules = import_profile(command)
+        total_ms = sum(top_level.values()) / 1000
+        heavy = sorted(module for module in HEAVY_MODULES if module in modules)
+        slowest = sorted(top_level.items(), key=lambda item: -item[1])[:5]
+        passed = total_ms <= budget_ms and not heavy
+        all_passed &= passed
+        print(f"{command}: {total_ms:.0f} ms of imports (budget {budget_ms:.0f} ms) - {'ok' if passed else 'FAILED'}")
+        print("    slowest: " + ", ".join(f"{name} {microseconds / 1000:.0f} ms" for name, microseconds in slowest))
+        if heavy:
+            print(f"    imports {', '.join(heavy)}")
+    return all_passed
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description="Course allocator commands.")
+    subcommands = parser.add_subparsers(dest="command", required=True, metavar="command")
+    for command, (_, _, description) in COMMANDS.items():
+        # The command's own parser handles its arguments, including --help.
+        subcommands.add_parser(command, help=description, add_help=False)
+    check = subcommands.add_parser("check-imports", help="check the cold-start import time of "
+                                                         + " and ".join(FAST_COMMANDS))
+    check.add_argument("--budget-ms", type=float, default=DEFAULT_IMPORT_BUDGET_MS,
+                       help="import time allowed per command")
+    args, rest = parser.parse_known_args(argv)
+
+    if args.command == "check-imports":
+        if rest:
+            parser.error(f"unrecognized arguments: {' '.join(rest)}")
+        sys.exit(0 if check_import_time(budget_ms=args.budget_ms) else 1)
+    load_command(args.command)(rest, prog=f"{parser.prog} {args.command}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,44 +1,66 @@
-import mysql.connector
-from mysql.connector import Error
+import argparse
 import random
 
-# Replace with your MySQL details
-MYSQL_HOST = "localhost"
-MYSQL_USER = "root"
-MYSQL_PASSWORD = "password"
-MYSQL_DB = "course_allocator_db"
+import numpy as np
 
-def create_db_connection():
-    """
-    Creates a database connection to the MySQL Server
-    """
-    connection = None
-    try:
-        connection = mysql.connector.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            passwd=MYSQL_PASSWORD,
-            database=MYSQL_DB
-        )
-        print("MySQL Database connection successful")
-    except Error as err:
-        print(f"Error: '{err}'")
-    return connection
+from allocate_courses import (ALLOCATION_PASS_QUERY, create_runs_table, create_summary_tables, create_working_tables,
+                              drop_working_tables)
+from allocation_metrics import METRICS_QUERY
+from db import create_db_connection, get_backend
+from results_writer import ALLOCATION_RESULTS_INDEXES, ALLOCATION_RESULTS_TABLE
+from waitlists import create_waitlists_table
+
+# Secondary indexes for the allocation and metrics access paths:
+# - allocation passes filter Preferences by rank and group by course,
+# - metrics join Preferences to Courses and Allocation_Results per course and student,
+# - incremental re-allocation deletes allocations by (student_id, course_id),
+# - each student holds each course at most once.
+INDEXES = [
+    ("idx_students_cgpa", "Students",
+     "CREATE INDEX idx_students_cgpa ON Students (cgpa, student_id);"),
+    ("idx_preferences_rank_course_student", "Preferences",
+     "CREATE INDEX idx_preferences_rank_course_student ON Preferences (preference_rank, course_id, student_id);"),
+    ("uq_preferences_student_course", "Preferences",
+     "CREATE UNIQUE INDEX uq_preferences_student_course ON Preferences (student_id, course_id);"),
+    ("idx_preferences_course", "Preferences",
+     "CREATE INDEX idx_preferences_course ON Preferences (course_id);"),
+] + [(name, "Allocation_Results", statement.format(table="Allocation_Results"))
+     for name, statement in ALLOCATION_RESULTS_INDEXES]
+
+# Indexes dropped during a synthetic bulk load and rebuilt at the end. On MySQL
+# the other indexes back the foreign keys on Preferences and Allocation_Results
+# and cannot be dropped (error 1553), so they stay in place.
+BULK_LOAD_INDEXES = {"idx_students_cgpa", "idx_preferences_rank_course_student"}
+
+MAJORS = ['Computer Science', 'Electrical Engineering', 'Mechanical Engineering', 'Business', 'Arts & Humanities']
+DEPARTMENTS = ['CS', 'EE', 'ME', 'Business', 'Arts']
+
+# (name, query, parameters, indexes of which at least one must be used)
+QUERY_PLAN_CHECKS = [
+    ("Allocation pass", ALLOCATION_PASS_QUERY, (1,), {"idx_preferences_rank_course_student"}),
+    ("Allocation metrics", METRICS_QUERY, None, {"uq_allocation_results_student_course", "idx_allocation_results_course"}),
+]
 
 def create_tables(connection):
     """
-    Sets up the necessary tables in the MySQL database.
+    Sets up the necessary tables in the configured database.
     """
+    backend = get_backend()
     cursor = connection.cursor()
 
     # Drop tables in a specific order to avoid foreign key constraints
     print("Dropping existing tables...")
-    cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
+    cursor.execute(backend.foreign_key_checks(False))
+    cursor.execute("DROP TABLE IF EXISTS Allocation_Runs;")
+    cursor.execute("DROP TABLE IF EXISTS Course_Summary;")
+    cursor.execute("DROP TABLE IF EXISTS Major_Summary;")
+    cursor.execute("DROP TABLE IF EXISTS Waitlists;")
+    cursor.execute("DROP TABLE IF EXISTS Allocation_Results_Staging;")
     cursor.execute("DROP TABLE IF EXISTS Allocation_Results;")
     cursor.execute("DROP TABLE IF EXISTS Preferences;")
     cursor.execute("DROP TABLE IF EXISTS Students;")
     cursor.execute("DROP TABLE IF EXISTS Courses;")
-    cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
+    cursor.execute(backend.foreign_key_checks(True))
 
     # Create Students table
     cursor.execute('''
@@ -61,9 +83,9 @@ def create_tables(connection):
     ''')
 
     # Create Preferences table
-    cursor.execute('''
+    cursor.execute(f'''
         CREATE TABLE Preferences (
-            pref_id INT PRIMARY KEY AUTO_INCREMENT,
+            pref_id {backend.id_column},
             student_id INT,
             course_id INT,
             preference_rank INT NOT NULL,
@@ -73,18 +95,61 @@ def create_tables(connection):
     ''')
 
     # Create Allocation_Results table (initially empty)
-    cursor.execute('''
-        CREATE TABLE Allocation_Results (
-            allocation_id INT PRIMARY KEY AUTO_INCREMENT,
-            student_id INT,
-            course_id INT,
-            FOREIGN KEY (student_id) REFERENCES Students(student_id),
-            FOREIGN KEY (course_id) REFERENCES Courses(course_id)
-        );
-    ''')
+    cursor.execute(ALLOCATION_RESULTS_TABLE.format(table="Allocation_Results", id_column=backend.id_column))
+
+    # Create the secondary indexes
+    for _, _, statement in INDEXES:
+        cursor.execute(statement)
     connection.commit()
+    create_runs_table(connection)
+    create_summary_tables(connection)
+    create_waitlists_table(connection)
     print("Tables created successfully.")
 
+def check_query_plans(connection):
+    """
+    EXPLAINs the allocation and metrics queries and reports whether each one
+    uses the indexes created by create_tables(). Returns True if all of them do.
+    """
+    backend = get_backend()
+    create_working_tables(connection)
+    cursor = connection.cursor()
+
+    print("\n--- Checking query plans ---")
+    all_indexed = True
+    for name, query, data, expected in QUERY_PLAN_CHECKS:
+        used = backend.used_indexes(cursor, query, data)
+        if used & expected:
+            print(f"{name}: uses {', '.join(sorted(used & expected))}")
+        else:
+            all_indexed = False
+            print(f"WARNING: {name} does not use any of {', '.join(sorted(expected))} "
+                  f"(uses {', '.join(sorted(used)) or 'no index'})")
+
+    cursor.close()
+    drop_working_tables(connection)
+    return all_indexed
+
+def clear_tables(connection):
+    """Empties all four tables, resets their auto-increment counters and forgets past runs, their summaries and waitlists."""
+    backend = get_backend()
+    cursor = connection.cursor()
+    print("Clearing existing data...")
+    cursor.execute(backend.foreign_key_checks(False))
+    for table in ["Students", "Courses", "Preferences", "Allocation_Results"]:
+        for statement in backend.truncate(table):
+            cursor.execute(statement)
+    # Runs are deleted without resetting their counter, so the next run still
+    # gets a new version number.
+    create_runs_table(connection)
+    create_summary_tables(connection)
+    create_waitlists_table(connection)
+    for table in ["Allocation_Runs", "Course_Summary", "Major_Summary", "Waitlists"]:
+        cursor.execute(f"DELETE FROM {table};")
+    connection.commit()
+    cursor.execute(backend.foreign_key_checks(True))
+    cursor.close()
+
 # ... (all imports and functions before populate_sample_data remain the same)
 
 def populate_sample_data(connection):
@@ -92,21 +157,13 @@ def populate_sample_data(connection):
     Populates the database with sample students, courses, and preferences.
     This version creates imbalanced data with popular courses.
     """
-    cursor = connection.cursor()
-
     # Clear existing data before re-populating
-    print("Clearing existing data...")
-    cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
-    cursor.execute("TRUNCATE TABLE Students;")
-    cursor.execute("TRUNCATE TABLE Courses;")
-    cursor.execute("TRUNCATE TABLE Preferences;")
-    cursor.execute("TRUNCATE TABLE Allocation_Results;")
-    cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
-    connection.commit()
+    clear_tables(connection)
+    cursor = connection.cursor()
 
     # --- 1. Realistic Students Data ---
     student_data = []
-    majors = ['Computer Science', 'Electrical Engineering', 'Mechanical Engineering', 'Business', 'Arts & Humanities']
+    majors = MAJORS
     
     # Create the initial 200 students
     for i in range(1, 201):  # 200 students
@@ -168,12 +225,146 @@ def populate_sample_data(connection):
     print("Sample data populated successfully.")
     cursor.close()
 
+def generate_students(num_students, rng):
+    """Returns student_id, cgpa and major-index arrays for a synthetic cohort."""
+    student_ids = np.arange(1, num_students + 1, dtype=np.int64)
+    cgpa = np.round(rng.uniform(2.5, 4.0, num_students), 2)
+    majors = rng.integers(0, len(MAJORS), num_students)
+    return student_ids, cgpa, majors
+
+def generate_courses(num_courses, num_students, demand_skew, rng, seat_ratio=0.85):
+    """
+    Returns course_id, department-index, capacity and popularity arrays.
+
+    Popularity follows a Zipf-like curve: course i is chosen with weight
+    1 / (i + 1) ** demand_skew, so a skew of 0 spreads demand evenly and larger
+    skews concentrate it on the first few courses. Capacities are drawn
+    independently of demand and add up to roughly seat_ratio seats per student.
+    """
+    course_ids = np.arange(101, 101 + num_courses, dtype=np.int64)
+    departments = np.arange(num_courses) % len(DEPARTMENTS)
+
+    weights = rng.uniform(0.5, 1.5, num_courses)
+    capacity = np.maximum(1, np.round(weights / weights.sum() * num_students * seat_ratio)).astype(np.int64)
+
+    popularity = 1.0 / np.arange(1, num_courses + 1) ** demand_skew
+    popularity /= popularity.sum()
+    return course_ids, departments, capacity, popularity
+
+def generate_preference_chunks(student_ids, course_ids, popularity, ranks_per_student, rng, chunk_size=None):
+    """
+    Yields (student_id, course_id, preference_rank) array triples, one chunk of
+    students at a time.
+
+    Each student ranks `ranks_per_student` distinct courses, drawn without
+    replacement in proportion to popularity using the Gumbel top-k trick, so a
+    whole chunk is sampled with a handful of array operations.
+    """
+    num_courses = len(course_ids)
+    ranks_per_student = min(ranks_per_student, num_courses)
+    if chunk_size is None:
+        # Keep the (students x courses) key matrix around 4M cells.
+        chunk_size = max(1, 4_000_000 // num_courses)
+
+    log_popularity = np.log(popularity)
+    rank_column = np.tile(np.arange(1, ranks_per_student + 1, dtype=np.int64), chunk_size)
+    for start in range(0, len(student_ids), chunk_size):
+        chunk_ids = student_ids[start:start + chunk_size]
+        keys = log_popularity + rng.gumbel(size=(len(chunk_ids), num_courses))
+
+        # The top-k keys per student are an ordered weighted sample without replacement.
+        top = np.argpartition(-keys, ranks_per_student - 1, axis=1)[:, :ranks_per_student]
+        order = np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1)
+        chosen = np.take_along_axis(top, order, axis=1)
+
+        yield (np.repeat(chunk_ids, ranks_per_student),
+               course_ids[chosen].ravel(),
+               rank_column[:len(chunk_ids) * ranks_per_student])
+
+def populate_synthetic_data(connection, num_students, num_courses, ranks_per_student=3, demand_skew=1.0,
+                            seed=None, chunk_size=50_000):
+    """
+    Populates the database with a generated cohort of any size.
+
+    The data is generated with vectorized NumPy sampling and streamed in chunks
+    through the backend's bulk path. Secondary indexes are dropped during the
+    load and rebuilt once at the end (see BULK_LOAD_INDEXES). A fixed seed makes runs reproducible.
+    """
+    backend = get_backend()
+    rng = np.random.default_rng(seed)
+
+    clear_tables(connection)
+    cursor = connection.cursor()
+    for name, table, _ in INDEXES:
+        if name in BULK_LOAD_INDEXES:
+            cursor.execute(backend.drop_index(name, table))
+    connection.commit()
+    cursor.close()
+
+    print(f"Populating Students table with {num_students} students...")
+    student_ids, cgpa, majors = generate_students(num_students, rng)
+    for start in range(0, num_students, chunk_size):
+        end = start + chunk_size
+        ids = student_ids[start:end].tolist()
+        backend.bulk_insert(connection, "Students", ["student_id", "name", "cgpa", "major"], list(zip(
+            ids,
+            [f'Student_{student_id}' for student_id in ids],
+            cgpa[start:end].tolist(),
+            [MAJORS[major] for major in majors[start:end].tolist()],
+        )))
+
+    print(f"Populating Courses table with {num_courses} courses...")
+    course_ids, departments, capacity, popularity = generate_courses(num_courses, num_students, demand_skew, rng)
+    backend.bulk_insert(connection, "Courses", ["course_id", "course_name", "department", "max_capacity"], list(zip(
+        course_ids.tolist(),
+        [f'Course_{course_id}' for course_id in course_ids.tolist()],
+        [DEPARTMENTS[department] for department in departments.tolist()],
+        capacity.tolist(),
+    )))
+
+    print("Populating Preferences table...")
+    total_preferences = 0
+    for pref_students, pref_courses, pref_ranks in generate_preference_chunks(
+        student_ids, course_ids, popularity, ranks_per_student, rng
+    ):
+        for start in range(0, len(pref_students), chunk_size):
+            end = start + chunk_size
+            backend.bulk_insert(connection, "Preferences", ["student_id", "course_id", "preference_rank"], list(zip(
+                pref_students[start:end].tolist(), pref_courses[start:end].tolist(), pref_ranks[start:end].tolist()
+            )))
+        total_preferences += len(pref_students)
+
+    print("Rebuilding indexes...")
+    cursor = connection.cursor()
+    for name, _, statement in INDEXES:
+        if name in BULK_LOAD_INDEXES:
+            cursor.execute(statement)
+    connection.commit()
+    cursor.close()
+    print(f"Synthetic data populated successfully ({total_preferences} preferences).")
+
 # ... (main block remains the same)
 
-if __name__ == '__main__':
-    # Ensure the database exists in MySQL Workbench before running this script
+def main(argv=None, prog=None):
+    """Command line entry point; `argv` defaults to sys.argv[1:]."""
+    parser = argparse.ArgumentParser(prog=prog, description="Create the tables and load sample or synthetic data.")
+    parser.add_argument("--students", type=int, help="generate a synthetic cohort with this many students")
+    parser.add_argument("--courses", type=int, default=100, help="number of synthetic courses")
+    parser.add_argument("--ranks", type=int, default=3, help="preferences per synthetic student")
+    parser.add_argument("--skew", type=float, default=1.0, help="demand skew towards the first courses (0 = uniform)")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible synthetic data")
+    args = parser.parse_args(argv)
+
+    # With the MySQL backend, ensure the database exists in MySQL Workbench before running this script
     connection = create_db_connection()
     if connection:
         create_tables(connection)
-        populate_sample_data(connection)
-        connection.close()
\ No newline at end of file
+        if args.students:
+            populate_synthetic_data(connection, args.students, args.courses, args.ranks, args.skew, args.seed)
+        else:
+            populate_sample_data(connection)
+        check_query_plans(connection)
+        connection.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,107 +1,230 @@
+import argparse
+import os
+import threading
+import time
+
 import dash
-from dash import dcc, html
+from dash import dash_table, dcc, html, Input, Output, State
 import plotly.express as px
 import pandas as pd
-import mysql.connector
-from mysql.connector import Error
-
-# Replace with your MySQL details
-MYSQL_HOST = "localhost"
-MYSQL_USER = "root"
-MYSQL_PASSWORD = "password"
-MYSQL_DB = "course_allocator_db"
-
-def get_data(query):
-    """Connects to MySQL and returns data as a pandas DataFrame."""
-    conn = None
+
+from allocate_courses import current_allocation_run
+from db import db_connection, fetch_frames
+from instrumentation import load_trace
+
+# Seconds a prepared page is served before the allocation version is checked again.
+CACHE_TTL_SECONDS = float(os.environ.get("DASHBOARD_CACHE_TTL", 60))
+
+# Set to a run id, or "latest", to draw the charts from a columnar snapshot
+# (see snapshots.py) instead of the database.
+DASHBOARD_SNAPSHOT = os.environ.get("DASHBOARD_SNAPSHOT")
+
+# The CGPA chart never ships more than about this many points to the browser.
+SCATTER_SAMPLE_SIZE = 2000
+DRILL_DOWN_PAGE_SIZE = 25
+
+ALLOCATED_EXPRESSION = "EXISTS (SELECT 1 FROM Allocation_Results ar WHERE ar.student_id = s.student_id)"
+
+# Students per major x CGPA bucket (0.1 wide) x allocation status.
+CGPA_BINS_QUERY = f"""
+    SELECT t.major, t.cgpa_bucket, t.allocated, COUNT(*) AS students
+    FROM (
+        SELECT s.major, ROUND(s.cgpa, 1) AS cgpa_bucket, {ALLOCATED_EXPRESSION} AS allocated
+        FROM Students s
+    ) t
+    GROUP BY t.major, t.cgpa_bucket, t.allocated;
+"""
+
+# A sample of about %s students, stratified by major and allocation status so
+# small groups keep their share of points. The shuffle key is a fixed hash of
+# student_id, so the same students are drawn on every refresh.
+CGPA_SAMPLE_QUERY = f"""
+    SELECT t.student_id, t.cgpa, t.major, t.allocated
+    FROM (
+        SELECT
+            u.student_id, u.cgpa, u.major, u.allocated,
+            ROW_NUMBER() OVER (PARTITION BY u.major, u.allocated ORDER BY u.shuffle) AS rn,
+            COUNT(*) OVER (PARTITION BY u.major, u.allocated) AS stratum_size,
+            COUNT(*) OVER () AS total_students
+        FROM (
+            SELECT
+                s.student_id, s.cgpa, s.major,
+                {ALLOCATED_EXPRESSION} AS allocated,
+                (s.student_id * 2654435761) % 4294967291 AS shuffle
+            FROM Students s
+        ) u
+    ) t
+    WHERE t.rn - 1 < t.stratum_size * 1.0 * %s / t.total_students;
+"""
+
+WAITLIST_LENGTHS_QUERY = "SELECT course_id, COUNT(*) AS waitlisted FROM Waitlists GROUP BY course_id;"
+
+# One row per student, even when they hold several courses: their courses are
+# listed together, and only for the students on the page.
+DRILL_DOWN_QUERY = """
+    SELECT
+        s.student_id, s.name, s.cgpa, s.major,
+        (SELECT GROUP_CONCAT(c.course_name)
+         FROM Allocation_Results ar
+         JOIN Courses c ON c.course_id = ar.course_id
+         WHERE ar.student_id = s.student_id) AS course_name
+    FROM Students s
+    {where}
+    ORDER BY s.cgpa DESC, s.student_id DESC
+    LIMIT %s OFFSET %s;
+"""
+
+DRILL_DOWN_COUNT_QUERY = """
+    SELECT COUNT(*) AS students
+    FROM Students s
+    {where};
+"""
+
+def load_snapshot_frames(snapshot):
+    """
+    Builds the same frames as the dashboard queries from a columnar snapshot,
+    or returns None if there is no such snapshot.
+    """
+    # pyarrow is only imported when the dashboard draws from snapshots.
+    from snapshots import latest_snapshot, load_snapshot
+
+    run_id = latest_snapshot() if snapshot == "latest" else int(snapshot)
+    if run_id is None:
+        return None
+    tables = load_snapshot(run_id, ["course_summary", "major_summary", "students", "allocation_results"])
+    if tables is None:
+        return None
+
+    students_df = tables['students'][['student_id', 'cgpa', 'major']]
+    students_df = students_df.assign(allocated=students_df['student_id'].isin(tables['allocation_results']['student_id']))
+    cgpa_bins_df = (students_df.assign(cgpa_bucket=students_df['cgpa'].astype('float64').round(1))
+                    .groupby(['major', 'cgpa_bucket', 'allocated'], observed=True).size()
+                    .reset_index(name='students'))
+    fraction = min(1.0, SCATTER_SAMPLE_SIZE / max(len(students_df), 1))
+    cgpa_sample_df = students_df.groupby(['major', 'allocated'], observed=True).sample(frac=fraction, random_state=0)
+    # Snapshots written before waitlists were recorded have no waitlists table.
     try:
-        conn = mysql.connector.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            passwd=MYSQL_PASSWORD,
-            database=MYSQL_DB
+        waitlists = load_snapshot(run_id, ['waitlists'])['waitlists']
+    except FileNotFoundError:
+        waitlists = pd.DataFrame(columns=['course_id'])
+    waitlist_lengths_df = waitlists.groupby('course_id').size().reset_index(name='waitlisted')
+    return [tables['course_summary'], tables['major_summary'], cgpa_bins_df, cgpa_sample_df.reset_index(drop=True),
+            waitlist_lengths_df]
+
+def load_dashboard_data(snapshot=None):
+    """
+    Loads the per-course and per-major summaries written by the allocator and
+    prepares every frame and KPI the dashboard shows. Returns them in a dict,
+    or None if nothing has been allocated yet or a table could not be loaded.
+
+    With `snapshot` (a run id or "latest") the data comes from a columnar
+    snapshot instead of the database.
+    """
+    if snapshot is not None:
+        frames = load_snapshot_frames(snapshot)
+    else:
+        frames = fetch_frames(
+            "SELECT course_id, course_name, max_capacity, preference_rank, preferences, allocated FROM Course_Summary;",
+            "SELECT major, students, allocated, first_choice_preferences, first_choice_allocated FROM Major_Summary;",
+            CGPA_BINS_QUERY,
+            (CGPA_SAMPLE_QUERY, (SCATTER_SAMPLE_SIZE,)),
+            WAITLIST_LENGTHS_QUERY,
         )
-        df = pd.read_sql(query, conn)
-        return df
-    except Error as err:
-        print(f"Error: '{err}'")
-        return pd.DataFrame()
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
-
-# --- Load and Prepare Data ---
-students_df = get_data("SELECT * FROM Students;")
-courses_df = get_data("SELECT * FROM Courses;")
-preferences_df = get_data("SELECT * FROM Preferences;")
-allocation_df = get_data("SELECT * FROM Allocation_Results;")
-full_df = get_data("""
-    SELECT 
-        s.student_id, s.name, s.cgpa, s.major, 
-        p.preference_rank, 
-        ar.allocation_id IS NOT NULL AS allocated,
-        c.course_name, c.max_capacity
-    FROM Students s
-    JOIN Preferences p ON s.student_id = p.student_id
-    LEFT JOIN Allocation_Results ar ON p.student_id = ar.student_id AND p.course_id = ar.course_id
-    LEFT JOIN Courses c ON p.course_id = c.course_id;
-""")
+    course_summary_df, major_summary_df, cgpa_bins_df, cgpa_sample_df, waitlist_lengths_df = \
+        frames or [pd.DataFrame()] * 5
 
-if not students_df.empty and not courses_df.empty and not preferences_df.empty and not allocation_df.empty and not full_df.empty:
+    if course_summary_df.empty or major_summary_df.empty or major_summary_df['allocated'].sum() == 0:
+        return None
 
     # Prepare data for dashboard charts
-    
+
     # Chart 1: Allocation Success Rate by Preference
-    allocation_by_rank = pd.merge(allocation_df, preferences_df, on=['student_id', 'course_id'], how='inner')
-    allocation_counts = allocation_by_rank['preference_rank'].value_counts().reset_index()
+    allocation_counts = (course_summary_df[course_summary_df['allocated'] > 0]
+                         .groupby('preference_rank')['allocated'].sum()
+                         .sort_values(ascending=False).reset_index())
     allocation_counts.columns = ['Preference Rank', 'Students Allocated']
+    allocation_counts['Preference Rank'] = allocation_counts['Preference Rank'].astype(int)
+
+    # One row per course: demand, capacity and allocated seats
+    courses_df = course_summary_df.groupby('course_id').agg(
+        course_name=('course_name', 'first'),
+        max_capacity=('max_capacity', 'first'),
+        total_preferences=('preferences', 'sum'),
+        students_allocated=('allocated', 'sum'),
+    ).reset_index()
 
     # Chart 2: Demand vs Capacity
-    demand_df = preferences_df.groupby('course_id').size().reset_index(name='total_preferences')
-    demand_supply_df = pd.merge(demand_df, courses_df, on='course_id')
+    demand_supply_df = courses_df[courses_df['total_preferences'] > 0].copy()
     demand_supply_df['Demand/Capacity Ratio'] = demand_supply_df['total_preferences'] / demand_supply_df['max_capacity']
     demand_supply_df.sort_values(by='Demand/Capacity Ratio', ascending=False, inplace=True)
 
     # NEW: Chart 3 - Allocation Success by Major
-    success_by_major_df = full_df[full_df['preference_rank'] == 1].groupby('major')['allocated'].mean().reset_index()
-    success_by_major_df['allocated'] = success_by_major_df['allocated'] * 100
+    success_by_major_df = major_summary_df[major_summary_df['first_choice_preferences'] > 0].copy()
+    success_by_major_df['allocated'] = (success_by_major_df['first_choice_allocated']
+                                        / success_by_major_df['first_choice_preferences'] * 100)
+    success_by_major_df = success_by_major_df[['major', 'allocated']]
 
-    # NEW: Chart 4 - CGPA vs Allocation
-    cgpa_allocation_df = full_df.drop_duplicates(subset=['student_id'])
-    cgpa_allocation_df['allocated'] = cgpa_allocation_df['allocated'].astype(str).replace({'True': 'Allocated', 'False': 'Unallocated'})
+    # NEW: Chart 4 - CGPA vs Allocation, binned and as a stratified sample
+    for df in (cgpa_bins_df, cgpa_sample_df):
+        df['allocated'] = df['allocated'].astype(bool).map({True: 'Allocated', False: 'Unallocated'})
 
     # NEW: Chart 5 - Courses with Remaining Seats
-    vacancies_df = pd.merge(allocation_df, courses_df, on='course_id', how='right')
-    vacancies_df = vacancies_df.groupby('course_id').agg(
-        students_allocated=('student_id', 'count'),
-        max_capacity=('max_capacity', 'first'),
-        course_name=('course_name', 'first')
-    ).reset_index()
+    vacancies_df = courses_df.copy()
     vacancies_df['remaining_seats'] = vacancies_df['max_capacity'] - vacancies_df['students_allocated']
     vacancies_df = vacancies_df[vacancies_df['remaining_seats'] > 0].sort_values(by='remaining_seats', ascending=False)
 
 
+    # Waitlist length of every course that has one, longest first
+    waitlists_df = courses_df.merge(waitlist_lengths_df, on='course_id')
+    waitlists_df = waitlists_df[waitlists_df['waitlisted'] > 0].sort_values(by='waitlisted', ascending=False)
+
     # Calculate KPIs
-    total_students = len(students_df)
-    total_allocated = len(allocation_df['student_id'].unique())
+    total_students = int(major_summary_df['students'].sum())
+    total_allocated = int(major_summary_df['allocated'].sum())
     unallocated_count = total_students - total_allocated
     first_choice_success_rate = round(allocation_counts[allocation_counts['Preference Rank'] == 1]['Students Allocated'].sum() / total_allocated * 100, 2)
     unallocated_rate = round(unallocated_count / total_students * 100, 2)
-    
-    # --- Build the Dash App ---
-    app = dash.Dash(__name__)
 
-    app.layout = html.Div(children=[
+    return {
+        'total_students': total_students,
+        'total_allocated': total_allocated,
+        'unallocated_count': unallocated_count,
+        'first_choice_success_rate': first_choice_success_rate,
+        'unallocated_rate': unallocated_rate,
+        'allocation_counts': allocation_counts,
+        'demand_supply_df': demand_supply_df,
+        'success_by_major_df': success_by_major_df,
+        'cgpa_bins_df': cgpa_bins_df,
+        'cgpa_sample_df': cgpa_sample_df,
+        'majors': sorted(major_summary_df['major'].dropna()),
+        'vacancies_df': vacancies_df,
+        'waitlists_df': waitlists_df,
+        'stage_timings_df': load_stage_timings(),
+    }
+
+def load_stage_timings(runs=20):
+    """Seconds per stage for the latest finished runs in the ALLOCATOR_TRACE stage trace, in long form."""
+    trace = load_trace().dropna(subset=['run_id'])
+    if trace.empty:
+        return trace
+    trace = trace[trace['run_id'].isin(sorted(trace['run_id'].unique())[-runs:])]
+    timings = trace.groupby(['run_id', 'stage'], as_index=False)['seconds'].sum()
+    timings['run_id'] = timings['run_id'].astype(int).astype(str)
+    return timings
+
+def build_layout(data):
+    """Builds the dashboard page from load_dashboard_data() output."""
+    return html.Div(children=[
         html.H1(children='Smart Course Allocator: Performance Dashboard', style={'textAlign': 'center'}),
         html.Hr(),
         
         # Section 1: Key Performance Indicators (KPIs)
         html.Div(children=[
-            html.Div(children=[html.H3('Total Students'), html.P(f'{total_students}', style={'fontSize': 24})], className='kpi'),
-            html.Div(children=[html.H3('Students Allocated'), html.P(f'{total_allocated}', style={'fontSize': 24})], className='kpi'),
-            html.Div(children=[html.H3('Unallocated'), html.P(f'{unallocated_count}', style={'fontSize': 24})], className='kpi'),
-            html.Div(children=[html.H3('1st Choice Success Rate'), html.P(f'{first_choice_success_rate}%', style={'fontSize': 24})], className='kpi'),
-            html.Div(children=[html.H3('Unallocated Rate'), html.P(f'{unallocated_rate}%', style={'fontSize': 24})], className='kpi')
+            html.Div(children=[html.H3('Total Students'), html.P(f'{data["total_students"]}', style={'fontSize': 24})], className='kpi'),
+            html.Div(children=[html.H3('Students Allocated'), html.P(f'{data["total_allocated"]}', style={'fontSize': 24})], className='kpi'),
+            html.Div(children=[html.H3('Unallocated'), html.P(f'{data["unallocated_count"]}', style={'fontSize': 24})], className='kpi'),
+            html.Div(children=[html.H3('1st Choice Success Rate'), html.P(f'{data["first_choice_success_rate"]}%', style={'fontSize': 24})], className='kpi'),
+            html.Div(children=[html.H3('Unallocated Rate'), html.P(f'{data["unallocated_rate"]}%', style={'fontSize': 24})], className='kpi')
         ], style={'display': 'flex', 'justifyContent': 'space-around', 'margin': '20px'}),
         html.Hr(),
         
@@ -109,11 +232,11 @@ if not students_df.empty and not courses_df.empty and not preferences_df.empty a
         html.Div(children=[
             dcc.Graph(
                 id='allocation-success-chart',
-                figure=px.pie(allocation_counts, values='Students Allocated', names='Preference Rank', title='Allocation Distribution by Preference Rank', hole=0.3)
+                figure=px.pie(data['allocation_counts'], values='Students Allocated', names='Preference Rank', title='Allocation Distribution by Preference Rank', hole=0.3)
             ),
             dcc.Graph(
                 id='demand-capacity-chart',
-                figure=px.bar(demand_supply_df.head(10), x='course_name', y='Demand/Capacity Ratio', title='Top 10 Courses by Demand/Capacity Ratio', labels={'course_name': 'Course Name', 'Demand/Capacity Ratio': 'Demand/Capacity Ratio'}, color='Demand/Capacity Ratio')
+                figure=px.bar(data['demand_supply_df'].head(10), x='course_name', y='Demand/Capacity Ratio', title='Top 10 Courses by Demand/Capacity Ratio', labels={'course_name': 'Course Name', 'Demand/Capacity Ratio': 'Demand/Capacity Ratio'}, color='Demand/Capacity Ratio')
             )
         ], style={'display': 'flex', 'justifyContent': 'space-around', 'flexWrap': 'wrap'}),
         html.Hr(),
@@ -122,26 +245,261 @@ if not students_df.empty and not courses_df.empty and not preferences_df.empty a
         html.Div(children=[
             dcc.Graph(
                 id='success-by-major-chart',
-                figure=px.bar(success_by_major_df, x='major', y='allocated', title='1st Preference Success Rate by Major', labels={'allocated': 'Success Rate (%)', 'major': 'Major'}, color='allocated')
+                figure=px.bar(data['success_by_major_df'], x='major', y='allocated', title='1st Preference Success Rate by Major', labels={'allocated': 'Success Rate (%)', 'major': 'Major'}, color='allocated')
             ),
-            dcc.Graph(
-                id='cgpa-allocation-chart',
-                figure=px.scatter(cgpa_allocation_df, x='cgpa', y='major', color='allocated', title='CGPA vs Allocation Status by Major', labels={'cgpa': 'CGPA', 'major': 'Major', 'allocated': 'Allocation Status'})
-            )
+            dcc.Tabs(id='cgpa-allocation-mode', value='binned', children=[
+                dcc.Tab(label='Binned', value='binned', children=dcc.Graph(
+                    id='cgpa-allocation-chart',
+                    figure=px.density_heatmap(data['cgpa_bins_df'], x='cgpa_bucket', y='major', z='students', facet_col='allocated', histfunc='sum', nbinsx=int(data['cgpa_bins_df']['cgpa_bucket'].nunique()), title='CGPA vs Allocation Status by Major', labels={'cgpa_bucket': 'CGPA', 'major': 'Major', 'allocated': 'Allocation Status', 'students': 'Students'})
+                )),
+                dcc.Tab(label='Sampled', value='sampled', children=dcc.Graph(
+                    id='cgpa-allocation-sample-chart',
+                    figure=px.scatter(data['cgpa_sample_df'], x='cgpa', y='major', color='allocated', title=f'CGPA vs Allocation Status by Major ({len(data["cgpa_sample_df"])} of {data["total_students"]} students)', labels={'cgpa': 'CGPA', 'major': 'Major', 'allocated': 'Allocation Status'})
+                )),
+            ])
         ], style={'display': 'flex', 'justifyContent': 'space-around', 'flexWrap': 'wrap'}),
 
+        # Student drill-down, one page at a time
+        html.Div(children=[
+            html.H3(children='Students', style={'textAlign': 'center'}),
+            html.Div(children=[
+                dcc.Dropdown(id='drill-down-major', options=data['majors'], placeholder='All majors', style={'width': '300px'}),
+                dcc.Dropdown(id='drill-down-status', options=['Allocated', 'Unallocated'], placeholder='Any status', style={'width': '200px'}),
+            ], style={'display': 'flex', 'justifyContent': 'center', 'gap': '10px'}),
+            dash_table.DataTable(
+                id='drill-down-table',
+                columns=[{'name': name, 'id': column} for column, name in [('student_id', 'Student ID'), ('name', 'Name'), ('cgpa', 'CGPA'), ('major', 'Major'), ('course_name', 'Allocated Courses')]],
+                page_current=0,
+                page_size=DRILL_DOWN_PAGE_SIZE,
+                page_action='custom',
+            )
+        ], style={'width': '80%', 'margin': 'auto'}),
+
         # NEW: Chart 5 - Courses with Vacancies
         html.Div(children=[
             html.H3(children='Courses with Remaining Seats', style={'textAlign': 'center'}),
             dcc.Graph(
                 id='vacant-courses-chart',
-                figure=px.bar(vacancies_df, x='course_name', y='remaining_seats', title='Courses with Remaining Seats', labels={'course_name': 'Course Name', 'remaining_seats': 'Remaining Seats'})
+                figure=px.bar(data['vacancies_df'], x='course_name', y='remaining_seats', title='Courses with Remaining Seats', labels={'course_name': 'Course Name', 'remaining_seats': 'Remaining Seats'})
             )
-        ], style={'width': '80%', 'margin': 'auto', 'textAlign': 'center'})
+        ], style={'width': '80%', 'margin': 'auto', 'textAlign': 'center'}),
+
+        # Waitlist length per full course
+        html.Div(children=[
+            html.H3(children='Waitlisted Students by Course', style={'textAlign': 'center'}),
+            dcc.Graph(
+                id='waitlists-chart',
+                figure=px.bar(data['waitlists_df'], x='course_name', y='waitlisted', title='Waitlist Length by Course', labels={'course_name': 'Course Name', 'waitlisted': 'Waitlisted Students'})
+            )
+        ], style={'width': '80%', 'margin': 'auto', 'textAlign': 'center'}),
+
+        # Run-over-run allocation timings, when a stage trace is configured
+        html.Div(children=[
+            html.H3(children='Allocation Run Time by Stage', style={'textAlign': 'center'}),
+            dcc.Graph(
+                id='stage-timings-chart',
+                figure=px.bar(data['stage_timings_df'], x='run_id', y='seconds', color='stage', title='Seconds per Stage by Run', labels={'run_id': 'Run', 'seconds': 'Seconds', 'stage': 'Stage'})
+            )
+        ], style={'width': '80%', 'margin': 'auto', 'textAlign': 'center'}) if not data['stage_timings_df'].empty else html.Div()
     ])
 
-    if __name__ == '__main__':
-        app.run(debug=True)
+def allocation_version():
+    """Returns the latest allocation run id, or None if it cannot be read."""
+    with db_connection() as connection:
+        if not connection:
+            return None
+        return current_allocation_run(connection)
+
+
+class CacheEntry:
+    def __init__(self, version, value):
+        self.version = version
+        self.value = value
+        self.checked_at = time.monotonic()
+
+
+class DashboardCache:
+    """
+    Keeps the prepared dashboard page in memory, keyed by the allocation version.
+
+    An entry is served as-is for `ttl` seconds. After that the next request
+    checks the version in a background thread: if no new run was recorded the
+    entry is renewed, otherwise the page is rebuilt while the stale one keeps
+    being served. Only the very first request waits for a build.
+    """
+
+    def __init__(self, build, version, ttl=CACHE_TTL_SECONDS):
+        self._build = build
+        self._version = version
+        self.ttl = ttl
+        self._entry = None
+        self._refresh_lock = threading.Lock()
+
+    def get(self):
+        """Returns the current CacheEntry, refreshing it if needed."""
+        entry = self._entry
+        if entry is None:
+            with self._refresh_lock:
+                if self._entry is None:
+                    self._refresh()
+            return self._entry
+
+        if time.monotonic() - entry.checked_at >= self.ttl and self._refresh_lock.acquire(blocking=False):
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        return entry
+
+    def invalidate(self):
+        """Drops the cached page; the next request rebuilds it."""
+        self._entry = None
 
+    def _refresh_in_background(self):
+        try:
+            self._refresh()
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self):
+        version = self._version()
+        entry = self._entry
+        if entry is not None and entry.value is not None and version is not None and version == entry.version:
+            self._entry = CacheEntry(version, entry.value)
+        else:
+            self._entry = CacheEntry(version, self._build())
+
+
+def build_page():
+    """Loads the dashboard data and builds the page, or returns None if it cannot be loaded."""
+    data = load_dashboard_data(DASHBOARD_SNAPSHOT)
+    return build_layout(data) if data is not None else None
+
+if DASHBOARD_SNAPSHOT == "latest":
+    from snapshots import latest_snapshot
+    cache = DashboardCache(build_page, latest_snapshot)
+elif DASHBOARD_SNAPSHOT is not None:
+    cache = DashboardCache(build_page, lambda: DASHBOARD_SNAPSHOT)
 else:
-    print("Dashboard could not be launched due to data loading issues.")
\ No newline at end of file
+    cache = DashboardCache(build_page, allocation_version)
+
+# --- Build the Dash App ---
+# The layout is only a shell; the page is filled in by the callback below, so
+# starting the app (or a worker process) does not touch the database.
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
+server = app.server
+app.layout = html.Div(children=[
+    dcc.Interval(id='refresh-interval', interval=CACHE_TTL_SECONDS * 1000),
+    dcc.Store(id='page-version'),
+    dcc.Loading(html.Div(id='page-content')),
+])
+
+@app.callback(
+    Output('page-content', 'children'),
+    Output('page-version', 'data'),
+    Input('refresh-interval', 'n_intervals'),
+    State('page-version', 'data'),
+)
+def refresh_page(_, shown_version):
+    entry = cache.get()
+    if entry.value is None:
+        return html.P("Dashboard data could not be loaded."), None
+    # Browsers that already show this version keep their page.
+    if shown_version is not None and shown_version == entry.version:
+        return dash.no_update, dash.no_update
+    return entry.value, entry.version
+
+def fetch_drill_down_page(page, page_size=DRILL_DOWN_PAGE_SIZE, major=None, status=None, snapshot=None):
+    """
+    Returns one page of students, best CGPA first, and the number of pages,
+    optionally filtered by major and allocation status. With `snapshot` (a run
+    id or "latest") the page comes from that snapshot, like the rest of the
+    dashboard.
+    """
+    if snapshot is not None:
+        return fetch_snapshot_drill_down_page(snapshot, page, page_size, major, status)
+
+    conditions, data = [], []
+    if major:
+        conditions.append("s.major = %s")
+        data.append(major)
+    if status == 'Allocated':
+        conditions.append(ALLOCATED_EXPRESSION)
+    elif status == 'Unallocated':
+        conditions.append("NOT " + ALLOCATED_EXPRESSION)
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    frames = fetch_frames(
+        (DRILL_DOWN_QUERY.format(where=where), tuple(data) + (page_size, page * page_size)),
+        (DRILL_DOWN_COUNT_QUERY.format(where=where), tuple(data)),
+    )
+    if frames is None:
+        return [], 0
+    rows, count = frames
+    return rows.to_dict('records'), max(1, -(-int(count['students'].iloc[0]) // page_size))
+
+# run_id -> every student of a snapshot in drill-down order, built on first use.
+_snapshot_drill_down = {}
+
+def snapshot_drill_down_frame(snapshot):
+    """
+    Returns the students of a snapshot, best CGPA first, with their allocated
+    courses and allocation status, or None if there is no such snapshot.
+    """
+    from snapshots import latest_snapshot, load_snapshot
+
+    run_id = latest_snapshot() if snapshot == "latest" else int(snapshot)
+    if run_id is None:
+        return None
+    if run_id not in _snapshot_drill_down:
+        tables = load_snapshot(run_id, ["students", "courses", "allocation_results"])
+        if tables is None:
+            return None
+        course_names = (tables['allocation_results'][['student_id', 'course_id']]
+                        .merge(tables['courses'][['course_id', 'course_name']], on='course_id')
+                        .groupby('student_id')['course_name'].agg(','.join))
+        students = tables['students']
+        students = students.assign(cgpa=students['cgpa'].astype('float64').round(2),
+                                   course_name=students['student_id'].map(course_names))
+        students = students.assign(allocated=students['course_name'].notna())
+        _snapshot_drill_down[run_id] = students.sort_values(['cgpa', 'student_id'], ascending=False,
+                                                            ignore_index=True)
+    return _snapshot_drill_down[run_id]
+
+def fetch_snapshot_drill_down_page(snapshot, page, page_size=DRILL_DOWN_PAGE_SIZE, major=None, status=None):
+    """fetch_drill_down_page() for a snapshot."""
+    students = snapshot_drill_down_frame(snapshot)
+    if students is None:
+        return [], 0
+    if major:
+        students = students[students['major'] == major]
+    if status in ('Allocated', 'Unallocated'):
+        students = students[students['allocated'] == (status == 'Allocated')]
+    rows = students.iloc[page * page_size:(page + 1) * page_size]
+    rows = rows[['student_id', 'name', 'cgpa', 'major', 'course_name']].astype(object)
+    return rows.where(rows.notna(), None).to_dict('records'), max(1, -(-len(students) // page_size))
+
+@app.callback(
+    Output('drill-down-table', 'data'),
+    Output('drill-down-table', 'page_count'),
+    Output('drill-down-table', 'page_current'),
+    Input('drill-down-table', 'page_current'),
+    Input('drill-down-table', 'page_size'),
+    Input('drill-down-major', 'value'),
+    Input('drill-down-status', 'value'),
+)
+def update_drill_down(page_current, page_size, major, status):
+    # A new filter starts again from the first page, in the same round trip.
+    if dash.ctx.triggered_id in ('drill-down-major', 'drill-down-status'):
+        page_current = 0
+    page_current = page_current or 0
+    rows, page_count = fetch_drill_down_page(page_current, page_size, major, status, DASHBOARD_SNAPSHOT)
+    return rows, page_count, page_current
+
+def main(argv=None, prog=None):
+    """Command line entry point; `argv` defaults to sys.argv[1:]."""
+    parser = argparse.ArgumentParser(prog=prog, description="Launch the interactive dashboard.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8050)
+    args = parser.parse_args(argv)
+    app.run(host=args.host, port=args.port, debug=True)
+
+if __name__ == '__main__':
+    main()
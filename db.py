@@ -0,0 +1,466 @@
+"""
+Shared data-access layer for the course allocator scripts.
+
+Every script gets its connections from the configured storage backend instead
+of opening its own. Two backends are available:
+
+    mysql    pooled connections to a MySQL server (the default)
+    sqlite   an in-process SQLite file, e.g. the shipped course_allocator.db
+
+Settings come from the environment (or an INI file named by
+ALLOCATOR_DB_CONFIG) instead of constants in every script:
+
+    ALLOCATOR_BACKEND                                  mysql or sqlite
+    MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB   MySQL connection settings
+    MYSQL_POOL_SIZE                                    pooled connections (default 5)
+    MYSQL_POOL_TIMEOUT                                 seconds to wait for a free pooled connection (default 30)
+    MYSQL_LOCAL_INFILE                                 1 to bulk load with LOAD DATA LOCAL INFILE
+    ALLOCATOR_SQLITE_PATH                              SQLite database file (default course_allocator.db)
+    ALLOCATOR_DB_CONFIG                                optional INI file with [backend], [mysql] and [sqlite] sections
+"""
+import configparser
+import csv
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_CONFIG = {
+    "backend": "mysql",
+    "host": "localhost",
+    "user": "root",
+    "password": "password",
+    "database": "course_allocator_db",
+    "pool_size": "5",
+    "pool_timeout": "30",
+    "local_infile": "0",
+    "sqlite_path": "course_allocator.db",
+}
+
+ENVIRONMENT_KEYS = {
+    "backend": "ALLOCATOR_BACKEND",
+    "host": "MYSQL_HOST",
+    "user": "MYSQL_USER",
+    "password": "MYSQL_PASSWORD",
+    "database": "MYSQL_DB",
+    "pool_size": "MYSQL_POOL_SIZE",
+    "pool_timeout": "MYSQL_POOL_TIMEOUT",
+    "local_infile": "MYSQL_LOCAL_INFILE",
+    "sqlite_path": "ALLOCATOR_SQLITE_PATH",
+}
+
+_backend = None
+
+def load_db_config():
+    """
+    Returns the connection settings. Environment variables win over the INI
+    file, which wins over the defaults.
+    """
+    config = dict(DEFAULT_CONFIG)
+
+    config_path = os.environ.get("ALLOCATOR_DB_CONFIG")
+    if config_path:
+        parser = configparser.ConfigParser()
+        parser.read(config_path)
+        if parser.has_option("backend", "name"):
+            config["backend"] = parser.get("backend", "name")
+        if parser.has_section("mysql"):
+            config.update({key: value for key, value in parser.items("mysql") if key in DEFAULT_CONFIG})
+        if parser.has_option("sqlite", "path"):
+            config["sqlite_path"] = parser.get("sqlite", "path")
+
+    for key, variable in ENVIRONMENT_KEYS.items():
+        if variable in os.environ:
+            config[key] = os.environ[variable]
+
+    config["pool_size"] = int(config["pool_size"])
+    config["pool_timeout"] = float(config["pool_timeout"])
+    config["local_infile"] = str(config["local_infile"]).lower() in ("1", "true", "yes", "on")
+    return config
+
+
+# The MySQL driver is only imported when MySQL is the configured backend, so
+# SQLite runs start without it. NumPy and pandas are imported by the frame
+# helpers that need them.
+mysql = None
+if load_db_config()["backend"] == "mysql":
+    try:
+        import mysql.connector.pooling
+    except ImportError:
+        pass
+
+if mysql is not None:
+    Error = (mysql.connector.Error, sqlite3.Error)
+else:
+    Error = sqlite3.Error
+
+
+class MySQLBackend:
+    """
+    Pooled connections to a MySQL server.
+
+    The dashboard's callbacks and its background cache refresh take
+    connections from several threads at once, so the pool is created under a
+    lock, and a caller that finds every connection in use waits for one to be
+    handed back (up to MYSQL_POOL_TIMEOUT seconds) instead of failing at once.
+    """
+
+    name = "mysql"
+    id_column = "INT PRIMARY KEY AUTO_INCREMENT"
+    pool_retry_interval = 0.05
+
+    def __init__(self, config):
+        if mysql is None:
+            raise ImportError("mysql-connector-python is required for the mysql backend")
+        self.config = config
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def connect(self):
+        """Returns a pooled connection. Closing it hands it back to the pool."""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = mysql.connector.pooling.MySQLConnectionPool(
+                    pool_name="course_allocator",
+                    pool_size=self.config["pool_size"],
+                    host=self.config["host"],
+                    user=self.config["user"],
+                    passwd=self.config["password"],
+                    database=self.config["database"],
+                    allow_local_infile=self.config["local_infile"]
+                )
+                print(f"MySQL connection pool created ({self.config['pool_size']} connections).")
+
+        deadline = time.monotonic() + self.config["pool_timeout"]
+        while True:
+            try:
+                return self._pool.get_connection()
+            except mysql.connector.errors.PoolError:
+                # Every connection is in use; wait for one to be closed.
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(self.pool_retry_interval)
+
+    def foreign_key_checks(self, enabled):
+        return f"SET FOREIGN_KEY_CHECKS = {1 if enabled else 0};"
+
+    def truncate(self, table):
+        return [f"TRUNCATE TABLE {table};"]
+
+    def swap_table(self, table, staging, index_templates):
+        """
+        Indexes `staging` and replaces `table` with it. A multi-table RENAME
+        TABLE is atomic, so readers see either the old table or the new one.
+        """
+        return [f"DROP TABLE IF EXISTS {table}_Old;"] + [template.format(table=staging) for template in index_templates] + [
+            f"RENAME TABLE {table} TO {table}_Old, {staging} TO {table};",
+            f"DROP TABLE {table}_Old;",
+        ]
+
+    def drop_index(self, name, table):
+        return f"DROP INDEX {name} ON {table};"
+
+    def bulk_insert(self, connection, table, columns, rows):
+        """
+        Inserts one chunk of rows. With MYSQL_LOCAL_INFILE enabled the chunk is
+        streamed through LOAD DATA LOCAL INFILE; otherwise executemany() sends it
+        as a multi-row INSERT.
+        """
+        cursor = connection.cursor()
+        try:
+            if self.config["local_infile"]:
+                with tempfile.NamedTemporaryFile("w", suffix=".tsv", newline="", delete=False) as handle:
+                    csv.writer(handle, delimiter="\t", lineterminator="\n").writerows(rows)
+                try:
+                    cursor.execute(
+                        f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} "
+                        f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({', '.join(columns)});",
+                        (handle.name,)
+                    )
+                finally:
+                    os.remove(handle.name)
+            else:
+                placeholders = ", ".join(["%s"] * len(columns))
+                cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders});", rows)
+            connection.commit()
+        finally:
+            cursor.close()
+
+    def query_plan(self, cursor, query, data=None):
+        """Runs the query under EXPLAIN ANALYZE and returns the plan's lines with actual timings."""
+        cursor.execute("EXPLAIN ANALYZE " + query, data or ())
+        return [line for row in cursor.fetchall() for line in str(row[0]).splitlines()]
+
+    def used_indexes(self, cursor, query, data=None):
+        """Returns the names of the indexes MySQL's EXPLAIN reports for a query."""
+        cursor.execute("EXPLAIN " + query, data or ())
+        columns = [column[0] for column in cursor.description]
+        key_column = columns.index("key")
+        return {row[key_column] for row in cursor.fetchall() if row[key_column]}
+
+
+class SQLiteBackend:
+    """
+    An in-process SQLite database.
+
+    Connections run in WAL mode so the dashboard can read while the allocator
+    writes, and sqlite3 keeps every statement it has compiled in a per-connection
+    cache, so repeated queries run as prepared statements.
+    """
+
+    name = "sqlite"
+    id_column = "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+    def __init__(self, config):
+        self.config = config
+
+    def connect(self):
+        connection = sqlite3.connect(self.config["sqlite_path"], cached_statements=256)
+        connection.execute("PRAGMA journal_mode = WAL;")
+        connection.execute("PRAGMA synchronous = NORMAL;")
+        connection.execute("PRAGMA temp_store = MEMORY;")
+        connection.execute("PRAGMA foreign_keys = ON;")
+        return SQLiteConnection(connection)
+
+    def foreign_key_checks(self, enabled):
+        return f"PRAGMA foreign_keys = {'ON' if enabled else 'OFF'};"
+
+    def truncate(self, table):
+        return [f"DELETE FROM {table};", f"DELETE FROM sqlite_sequence WHERE name = '{table}';"]
+
+    def swap_table(self, table, staging, index_templates):
+        """
+        Replaces `table` with `staging` and indexes it in one transaction.
+        SQLite DDL is transactional, so other connections keep reading the old
+        table until the commit. Index names are database-wide, which is why the
+        indexes are only created once the old table and its indexes are gone.
+        """
+        return ["BEGIN;", f"DROP TABLE IF EXISTS {table};", f"ALTER TABLE {staging} RENAME TO {table};"] + [
+            template.format(table=table) for template in index_templates]
+
+    def drop_index(self, name, table):
+        return f"DROP INDEX IF EXISTS {name};"
+
+    def bulk_insert(self, connection, table, columns, rows):
+        """
+        Inserts one chunk of rows with a single prepared statement inside one
+        transaction, which is SQLite's fastest in-process bulk path.
+        """
+        cursor = connection.cursor()
+        try:
+            placeholders = ", ".join(["?"] * len(columns))
+            cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders});", rows)
+            connection.commit()
+        finally:
+            cursor.close()
+
+    def query_plan(self, cursor, query, data=None):
+        """
+        Returns the steps of SQLite's EXPLAIN QUERY PLAN for a query. SQLite has
+        no EXPLAIN ANALYZE, so the plan carries no timings.
+        """
+        cursor.execute("EXPLAIN QUERY PLAN " + query, data or ())
+        return [row[-1] for row in cursor.fetchall()]
+
+    def used_indexes(self, cursor, query, data=None):
+        """
+        Returns the names of the indexes in SQLite's EXPLAIN QUERY PLAN for a
+        query. Rowid and primary key lookups are reported as PRIMARY, like MySQL.
+        """
+        cursor.execute("EXPLAIN QUERY PLAN " + query, data or ())
+        indexes = set()
+        for row in cursor.fetchall():
+            detail = row[-1]
+            match = re.search(r"USING (?:COVERING )?INDEX (\w+)", detail)
+            if match:
+                name = match.group(1)
+                indexes.add("PRIMARY" if name.startswith("sqlite_autoindex") else name)
+            elif "PRIMARY KEY" in detail:
+                indexes.add("PRIMARY")
+        return indexes
+
+
+class SQLiteConnection:
+    """
+    Wraps a sqlite3 connection so the scripts can keep using MySQL-style %s
+    placeholders.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self):
+        return SQLiteCursor(self._connection.cursor())
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+    def is_connected(self):
+        return True
+
+
+class SQLiteCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, data=()):
+        return self._cursor.execute(query.replace("%s", "?"), data)
+
+    def executemany(self, query, data):
+        return self._cursor.executemany(query.replace("%s", "?"), data)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+BACKENDS = {
+    MySQLBackend.name: MySQLBackend,
+    SQLiteBackend.name: SQLiteBackend,
+}
+
+def get_backend():
+    """Creates the configured backend on first use and returns it."""
+    global _backend
+    if _backend is None:
+        config = load_db_config()
+        if config["backend"] not in BACKENDS:
+            raise ValueError(f"Unknown backend '{config['backend']}', expected one of {sorted(BACKENDS)}")
+        _backend = BACKENDS[config["backend"]](config)
+    return _backend
+
+def create_db_connection():
+    """
+    Returns a connection from the configured backend, or None if it cannot be
+    opened.
+    """
+    try:
+        return get_backend().connect()
+    except Error as err:
+        print(f"Error: '{err}'")
+        return None
+
+@contextmanager
+def db_connection():
+    """Context manager around create_db_connection() that always closes the connection."""
+    connection = create_db_connection()
+    try:
+        yield connection
+    finally:
+        if connection:
+            connection.close()
+
+def run_query(connection, query, data=None):
+    """
+    Executes a single statement and commits it, rolling back on error. Returns
+    the cursor's rowcount, or None if the statement failed.
+    """
+    cursor = connection.cursor()
+    try:
+        if data:
+            cursor.execute(query, data)
+        else:
+            cursor.execute(query)
+        connection.commit()
+        return cursor.rowcount
+    except Error as err:
+        print(f"Error: '{err}'")
+        connection.rollback()
+    finally:
+        cursor.close()
+
+def fetch_frames(*queries):
+    """
+    Runs every query on one connection and cursor and returns a list of
+    DataFrames, or None if any query fails. A query may also be given as a
+    (query, parameters) pair.
+    """
+    import pandas as pd
+
+    with db_connection() as connection:
+        if not connection:
+            return None
+        cursor = connection.cursor()
+        try:
+            frames = []
+            for query in queries:
+                query, data = query if isinstance(query, tuple) else (query, None)
+                if data:
+                    cursor.execute(query, data)
+                else:
+                    cursor.execute(query)
+                columns = [column[0] for column in cursor.description]
+                frames.append(pd.DataFrame.from_records(cursor.fetchall(), columns=columns, coerce_float=True))
+            return frames
+        except Error as err:
+            print(f"Error: '{err}'")
+            return None
+        finally:
+            cursor.close()
+
+def fetch_typed_frames(*queries, chunk_size=100_000):
+    """
+    Like fetch_frames(), but each query comes with a {column: dtype} dict and
+    rows are converted to typed arrays chunk by chunk, so a large result never
+    exists as one list of Python tuples. "category" columns are encoded once
+    every chunk has been read.
+    """
+    import numpy as np
+    import pandas as pd
+
+    with db_connection() as connection:
+        if not connection:
+            return None
+        cursor = connection.cursor()
+        try:
+            frames = []
+            for query, dtypes in queries:
+                cursor.execute(query)
+                columns = [column[0] for column in cursor.description]
+                record_dtype = [(column, object if dtypes.get(column, "category") == "category" else dtypes[column])
+                                for column in columns]
+                chunks = []
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    chunks.append(np.array(rows, dtype=record_dtype))
+                records = np.concatenate(chunks) if chunks else np.empty(0, dtype=record_dtype)
+                frame = pd.DataFrame({column: records[column] for column in columns})
+                frames.append(frame.astype({column: "category" for column, dtype in record_dtype if dtype is object}))
+            return frames
+        except Error as err:
+            print(f"Error: '{err}'")
+            return None
+        finally:
+            cursor.close()
+
+def fetch_frame(query, data=None):
+    """Returns the result of a single query as a DataFrame, or None on error."""
+    frames = fetch_frames((query, data))
+    return frames[0] if frames else None
@@ -0,0 +1,158 @@
+"""
+Vectorized fairness measures for equity reviews of an allocation.
+
+Every measure is computed over whole columns, so a review of millions of
+preference rows takes seconds:
+
+- rank-weighted satisfaction: 1 for a first choice, falling linearly to 1/n
+  for the last (n-th) rank a student listed, and 0 without a course;
+- CGPA-decile curves: the allocation, first-choice and satisfaction rates of
+  each tenth of the cohort by CGPA (decile 10 has the highest CGPAs);
+- envy: a student envies every seat in a course they ranked above all the
+  courses they hold. The envy is justified when the seat's holder has a lower
+  CGPA. Seats are sorted once by (course, CGPA), so the seats of a course held
+  by lower-CGPA students are counted with binary searches instead of a
+  pairwise scan;
+- percentile bootstrap confidence intervals for every rate and mean.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_BOOTSTRAP_SAMPLES = 1000
+DEFAULT_CONFIDENCE = 0.95
+CGPA_GROUPS = 10
+
+# Per-student outcome columns that summarize() reports, with their labels.
+MEASURES = {
+    "allocated": "Allocated",
+    "first_choice": "1st choice",
+    "satisfaction": "Rank-weighted satisfaction",
+    "justified_envy": "Has justified envy",
+}
+
+
+def student_outcomes(students_df, preferences_df, allocation_df, allocated):
+    """
+    Returns one row per student, in students_df order, with their CGPA
+    decile, whether they got a course and their first choice, their
+    rank-weighted satisfaction, and the envied and justifiably envied seats.
+    `allocated` flags the preferences_df rows that were allocated.
+    """
+    student_ids = pd.Index(students_df['student_id'].to_numpy())
+    num_students = len(student_ids)
+    cgpa = students_df['cgpa'].to_numpy(np.float64)
+    pref_student = student_ids.get_indexer(preferences_df['student_id'].to_numpy())
+    ranks = preferences_df['preference_rank'].to_numpy(np.int64)
+
+    # Best (lowest) rank each student holds, and the last rank they listed.
+    unallocated_rank = np.iinfo(np.int64).max
+    best_rank = np.full(num_students, unallocated_rank, dtype=np.int64)
+    np.minimum.at(best_rank, pref_student[allocated], ranks[allocated])
+    last_rank = np.zeros(num_students, dtype=np.int64)
+    np.maximum.at(last_rank, pref_student, ranks)
+
+    has_course = best_rank != unallocated_rank
+    satisfaction = np.zeros(num_students)
+    satisfaction[has_course] = (last_rank[has_course] - best_rank[has_course] + 1) / last_rank[has_course]
+
+    decile = np.empty(num_students, dtype=np.int64)
+    decile[np.argsort(cgpa, kind='stable')] = np.arange(num_students) * CGPA_GROUPS // max(num_students, 1) + 1
+
+    envy_seats, justified_envy_seats = _envy_seats(
+        cgpa, pref_student, preferences_df['course_id'].to_numpy(), ranks < best_rank[pref_student],
+        student_ids.get_indexer(allocation_df['student_id'].to_numpy()), allocation_df['course_id'].to_numpy())
+
+    return pd.DataFrame({
+        'student_id': student_ids,
+        'cgpa': cgpa,
+        'major': students_df['major'].to_numpy(),
+        'cgpa_decile': decile,
+        'allocated': has_course,
+        'first_choice': best_rank == 1,
+        'satisfaction': satisfaction,
+        'envy_seats': envy_seats,
+        'justified_envy_seats': justified_envy_seats,
+        'justified_envy': justified_envy_seats > 0,
+    })
+
+
+def _envy_seats(cgpa, pref_student, pref_course, envious, holder_student, holder_course):
+    """
+    For every student, counts the seats held by others in courses they ranked
+    above everything they hold (`envious` preferences), and how many of those
+    are held by students with a lower CGPA.
+    """
+    num_students = len(cgpa)
+    _, cgpa_level = np.unique(cgpa, return_inverse=True)
+    levels = np.int64(cgpa_level.max() + 1 if num_students else 1)
+    _, course_codes = np.unique(np.concatenate([pref_course, holder_course]), return_inverse=True)
+    pref_code = course_codes[:len(pref_course)].astype(np.int64)
+    holder_code = course_codes[len(pref_course):].astype(np.int64)
+
+    # One sorted key per seat: course first, then the holder's CGPA level.
+    seat_keys = np.sort(holder_code * levels + cgpa_level[holder_student])
+
+    students = pref_student[envious]
+    courses = pref_code[envious]
+    first_seat = np.searchsorted(seat_keys, courses * levels, side='left')
+    end_seat = np.searchsorted(seat_keys, (courses + 1) * levels, side='left')
+    first_higher_seat = np.searchsorted(seat_keys, courses * levels + cgpa_level[students], side='left')
+
+    envy_seats = np.bincount(students, weights=end_seat - first_seat, minlength=num_students)
+    justified_seats = np.bincount(students, weights=first_higher_seat - first_seat, minlength=num_students)
+    return envy_seats.astype(np.int64), justified_seats.astype(np.int64)
+
+
+def bootstrap_mean(values, samples=DEFAULT_BOOTSTRAP_SAMPLES, confidence=DEFAULT_CONFIDENCE, rng=None):
+    """
+    Returns the mean of `values` and its percentile bootstrap confidence
+    interval as (mean, low, high). Resampling n values with replacement only
+    changes how often each distinct value is drawn, so every replicate is a
+    multinomial draw over the distinct values instead of n random indexes.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return np.nan, np.nan, np.nan
+    rng = rng if rng is not None else np.random.default_rng(0)
+    distinct, counts = np.unique(values, return_counts=True)
+    draws = rng.multinomial(len(values), counts / len(values), size=samples)
+    means = draws @ distinct / len(values)
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(means, [tail, 100 - tail])
+    return float(values.mean()), float(low), float(high)
+
+
+def summarize(outcomes, by=None, samples=DEFAULT_BOOTSTRAP_SAMPLES, confidence=DEFAULT_CONFIDENCE, seed=0):
+    """
+    Returns the mean and bootstrap interval of every MEASURES column, for the
+    whole cohort or per value of the `by` column, in long form: one row per
+    (group, measure) with mean, low, high and students.
+    """
+    rng = np.random.default_rng(seed)
+    groups = [("all", outcomes)] if by is None else outcomes.groupby(by, observed=True)
+    rows = []
+    for group, frame in groups:
+        for measure in MEASURES:
+            mean, low, high = bootstrap_mean(frame[measure].to_numpy(), samples, confidence, rng)
+            rows.append({"group": group, "measure": measure, "mean": mean, "low": low, "high": high,
+                         "students": len(frame)})
+    return pd.DataFrame(rows, columns=["group", "measure", "mean", "low", "high", "students"])
+
+
+def summary_to_dict(summary):
+    """Turns a summarize() frame into {group: {measure: {"mean", "low", "high"}}}, rounded for JSON."""
+    nested = {}
+    for row in summary.itertuples(index=False):
+        nested.setdefault(str(row.group), {})[row.measure] = {
+            "mean": round(row.mean, 4), "low": round(row.low, 4), "high": round(row.high, 4)}
+    return nested
+
+
+def envy_totals(outcomes):
+    """Cohort-wide envy counts."""
+    return {
+        "envious_students": int((outcomes['envy_seats'] > 0).sum()),
+        "envied_seats": int(outcomes['envy_seats'].sum()),
+        "students_with_justified_envy": int(outcomes['justified_envy'].sum()),
+        "justified_envy_seats": int(outcomes['justified_envy_seats'].sum()),
+    }
@@ -0,0 +1,141 @@
+"""
+Per-stage timing for the allocation pipeline.
+
+Every stage of a run (each rank pass, the results swap, the metrics query,
+the summary refresh, ...) is wrapped in a timer:
+
+    with get_tracer().stage("rank_pass", rank=rank) as record:
+        record["rows"] = run_query(connection, query, (rank,))
+
+When ALLOCATOR_TRACE names a file, each finished stage is appended to it as
+one JSON line. The last line of a run has stage "run" and the run_id recorded
+in Allocation_Runs, so load_trace() can attach every stage to its run:
+
+    {"trace_id": "5f1c...", "stage": "rank_pass", "rank": 1, "rows": 9637, "seconds": 0.412, ...}
+    {"trace_id": "5f1c...", "stage": "run", "run_id": 42, "engine": "sql", "seconds": 1.934, ...}
+
+With ALLOCATOR_TRACE_EXPLAIN=1 the traced queries also record their plan:
+EXPLAIN ANALYZE on MySQL, which runs the query a second time, or EXPLAIN
+QUERY PLAN on SQLite. Without ALLOCATOR_TRACE nothing is written and a stage
+costs two clock reads. pandas is only imported to read a trace back.
+"""
+import cProfile
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from db import Error, get_backend
+
+TRACE_PATH = os.environ.get("ALLOCATOR_TRACE")
+TRACE_EXPLAIN = os.environ.get("ALLOCATOR_TRACE_EXPLAIN", "0").lower() in ("1", "true", "yes", "on")
+
+_tracer = None
+
+
+class Tracer:
+    """Times the stages of one run and appends them to a JSON-lines trace file."""
+
+    def __init__(self, path=None, explain=False):
+        self.path = path
+        self.explain = explain
+        self.trace_id = uuid.uuid4().hex
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """
+        Times the block and writes one record for it. The block can add to the
+        yielded record, typically "rows" from cursor.rowcount.
+        """
+        record = {"stage": name, **fields, "rows": None}
+        started_at = _timestamp()
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - started, 6)
+            self.write(dict(record, started_at=started_at))
+
+    def explain_query(self, record, cursor, query, data=None):
+        """Adds the query's plan to a stage record if plans are being captured."""
+        if not self.explain:
+            return
+        try:
+            record["plan"] = get_backend().query_plan(cursor, query, data)
+        except Error as err:
+            record["plan"] = [f"Error: '{err}'"]
+
+    def finish(self, run_id, **fields):
+        """Writes the closing "run" record, which ties the trace to a run id."""
+        self.write({"stage": "run", "run_id": run_id, **fields, "started_at": _timestamp(),
+                    "seconds": round(time.perf_counter() - self._started, 6)})
+
+    def write(self, record):
+        if self.path:
+            with open(self.path, "a") as handle:
+                handle.write(json.dumps({"trace_id": self.trace_id, **record}, default=str) + "\n")
+
+
+def _timestamp():
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def start_trace(path=None, explain=None):
+    """Starts a new trace for a run. Defaults come from ALLOCATOR_TRACE and ALLOCATOR_TRACE_EXPLAIN."""
+    global _tracer
+    _tracer = Tracer(path or TRACE_PATH, TRACE_EXPLAIN if explain is None else explain)
+    return _tracer
+
+
+def get_tracer():
+    """Returns the current run's tracer, starting one on first use."""
+    return _tracer or start_trace()
+
+
+@contextmanager
+def profile_to(path):
+    """Runs the block under cProfile and dumps the stats to `path` (no-op without a path)."""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Profile written to {path}")
+
+
+def load_trace(path=None):
+    """
+    Reads a trace file into a DataFrame with one row per stage and the run_id
+    of the run it belongs to. Stages of runs that did not finish have no
+    run_id. Returns an empty DataFrame if there is no trace.
+    """
+    import pandas as pd
+
+    path = path or TRACE_PATH
+    if not path or not os.path.exists(path):
+        return pd.DataFrame(columns=["trace_id", "run_id", "stage", "seconds", "rows"])
+    with open(path) as handle:
+        trace = pd.DataFrame([json.loads(line) for line in handle if line.strip()])
+    runs = trace[trace["stage"] == "run"].set_index("trace_id")["run_id"]
+    stages = trace[trace["stage"] != "run"].drop(columns=["run_id"], errors="ignore")
+    return stages.assign(run_id=stages["trace_id"].map(runs))
+
+
+def stage_seconds(trace):
+    """Returns total seconds per stage for every finished run, as a (run_id x stage) table."""
+    import pandas as pd
+
+    finished = trace.dropna(subset=["run_id"])
+    if finished.empty:
+        return pd.DataFrame()
+    table = finished.pivot_table(index="run_id", columns="stage", values="seconds", aggfunc="sum", fill_value=0)
+    table.index = table.index.astype(int)
+    return table
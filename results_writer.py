@@ -0,0 +1,120 @@
+"""
+Streaming writer for Allocation_Results.
+
+A run's allocations are written to a staging table in large batches through
+the backend's bulk path (multi-row INSERTs, or LOAD DATA LOCAL INFILE on MySQL)
+and the staging table then replaces Allocation_Results in one atomic swap.
+Readers see either the previous run's results or the new ones, never a
+half-filled table.
+"""
+from itertools import islice
+
+from db import Error, get_backend
+from instrumentation import get_tracer
+
+ALLOCATION_RESULTS_COLUMNS = ["student_id", "course_id", "preference_rank"]
+
+ALLOCATION_RESULTS_TABLE = """
+    CREATE TABLE {table} (
+        allocation_id {id_column},
+        student_id INT,
+        course_id INT,
+        preference_rank INT,
+        FOREIGN KEY (student_id) REFERENCES Students(student_id),
+        FOREIGN KEY (course_id) REFERENCES Courses(course_id)
+    );
+"""
+
+# (name, statement) pairs; {table} is Allocation_Results or its staging table.
+# A student can hold several courses (see deferred_acceptance), but each at most once.
+ALLOCATION_RESULTS_INDEXES = [
+    ("uq_allocation_results_student_course",
+     "CREATE UNIQUE INDEX uq_allocation_results_student_course ON {table} (student_id, course_id);"),
+    ("idx_allocation_results_course",
+     "CREATE INDEX idx_allocation_results_course ON {table} (course_id);"),
+]
+
+
+class AllocationResultsWriter:
+    """
+    Stages a complete set of allocations and swaps it in for
+    Allocation_Results when the block exits cleanly. If the block raises, the
+    staging table is dropped and Allocation_Results is left untouched.
+
+        with AllocationResultsWriter(connection) as writer:
+            writer.write(rows)  # (student_id, course_id, preference_rank) tuples
+
+    Rows can also be inserted into `writer.staging_table` directly with SQL.
+    `swapped` tells whether the new results were installed.
+    """
+
+    def __init__(self, connection, batch_size=50_000, table="Allocation_Results"):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.table = table
+        self.staging_table = f"{table}_Staging"
+        self.rows_written = 0
+        self.swapped = False
+        self._backend = get_backend()
+        self._buffer = []
+
+    def __enter__(self):
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.staging_table};")
+            cursor.execute(ALLOCATION_RESULTS_TABLE.format(table=self.staging_table, id_column=self._backend.id_column))
+            self.connection.commit()
+        finally:
+            cursor.close()
+        return self
+
+    def write(self, rows):
+        """Buffers rows from any iterable, flushing every `batch_size` rows."""
+        rows = iter(rows)
+        while True:
+            self._buffer.extend(islice(rows, self.batch_size - len(self._buffer)))
+            if len(self._buffer) < self.batch_size:
+                return
+            self.flush()
+
+    def flush(self):
+        """Sends the buffered rows to the staging table as one bulk insert."""
+        if self._buffer:
+            self._backend.bulk_insert(self.connection, self.staging_table, ALLOCATION_RESULTS_COLUMNS, self._buffer)
+            self.rows_written += len(self._buffer)
+            self._buffer = []
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            try:
+                self.flush()
+                self.swap()
+            except Error as err:
+                print(f"Error: '{err}'")
+                self.connection.rollback()
+        if not self.swapped:
+            self.discard()
+        return False
+
+    def swap(self):
+        """Indexes the staging table and atomically replaces Allocation_Results with it."""
+        templates = [statement for _, statement in ALLOCATION_RESULTS_INDEXES]
+        self.connection.commit()
+        cursor = self.connection.cursor()
+        try:
+            with get_tracer().stage("swap_results"):
+                for statement in self._backend.swap_table(self.table, self.staging_table, templates):
+                    cursor.execute(statement)
+                self.connection.commit()
+            self.swapped = True
+        finally:
+            cursor.close()
+
+    def discard(self):
+        """Drops the staging table."""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.staging_table};")
+            self.connection.commit()
+        finally:
+            cursor.close()
@@ -0,0 +1,169 @@
+"""
+What-if capacity scenarios.
+
+Runs many allocation variants of the same base dataset in memory, across a
+process pool, without touching Allocation_Results. The base arrays are placed
+in shared memory once; workers attach to them when they start, so each task
+only ships its small Scenario description.
+
+    python scenarios.py --scenario "ML 20 seats:103=20" --scenario "Bigger CS:101=15,102=15"
+"""
+import argparse
+import copy
+import json
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from allocation_engine import (allocate, attach_allocation_data, deferred_acceptance, load_allocation_data,
+                               share_allocation_data)
+from allocation_metrics import metrics_from_allocation
+from db import db_connection
+
+# Allocation policies a scenario can choose from.
+POLICIES = {
+    "rank_passes": allocate,
+    "deferred_acceptance": deferred_acceptance,
+}
+
+
+@dataclass
+class Scenario:
+    """
+    One what-if variant of the base dataset.
+
+    capacities overrides max_capacity per course_id, capacity_scale multiplies
+    every capacity (before the overrides), max_rank ignores preferences ranked
+    below it and policy picks the allocation algorithm from POLICIES.
+    """
+
+    name: str
+    capacities: dict = field(default_factory=dict)
+    capacity_scale: float = 1.0
+    max_rank: int = None
+    policy: str = "rank_passes"
+
+
+def apply_scenario(data, scenario):
+    """Returns a shallow copy of `data` with the scenario's overrides applied."""
+    variant = copy.copy(data)
+
+    capacity = np.round(data.capacity * scenario.capacity_scale).astype(np.int32)
+    if scenario.capacities:
+        index = data.index_courses(list(scenario.capacities))
+        capacity[index] = [scenario.capacities[course_id] for course_id in data.course_ids[index].tolist()]
+    variant.capacity = capacity
+
+    if scenario.max_rank is not None:
+        keep = data.pref_rank <= scenario.max_rank
+        variant.pref_student = data.pref_student[keep]
+        variant.pref_course = data.pref_course[keep]
+        variant.pref_rank = data.pref_rank[keep]
+    return variant
+
+
+def evaluate_scenario(data, scenario):
+    """Allocates one scenario in memory and returns its KPIs as a flat dict."""
+    variant = apply_scenario(data, scenario)
+    student_index, course_index, ranks = POLICIES[scenario.policy](variant)
+    metrics = metrics_from_allocation(variant, student_index, course_index, ranks)
+
+    row = {
+        "scenario": scenario.name,
+        "total_students": metrics.total_students,
+        "allocated": metrics.allocated_count,
+        "unallocated": metrics.unallocated_count,
+        "first_choice_rate": metrics.first_choice_rate,
+    }
+    for rank, count in metrics.allocations_by_rank.items():
+        row[f"rank_{rank}"] = count
+    row["vacant_seats"] = sum(seats for _, seats in metrics.vacancies)
+    row["oversubscribed_courses"] = len(metrics.oversubscribed)
+    return row
+
+
+# --- Pool workers ---
+
+_worker_data = None
+
+def _attach_worker(shared_spec):
+    """Pool initializer: attaches this worker to the shared base dataset."""
+    global _worker_data
+    _worker_data = attach_allocation_data(shared_spec)
+
+def _evaluate_in_worker(scenario):
+    return evaluate_scenario(_worker_data, scenario)
+
+
+def run_scenarios(data, scenarios, workers=None, include_baseline=True):
+    """
+    Evaluates every scenario against `data` across a process pool and returns a
+    comparison DataFrame with one row per scenario.
+    """
+    scenarios = list(scenarios)
+    if include_baseline:
+        scenarios.insert(0, Scenario("baseline"))
+
+    segments, shared_spec = share_allocation_data(data)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_worker,
+                                 initargs=(shared_spec,)) as executor:
+            rows = list(executor.map(_evaluate_in_worker, scenarios))
+    finally:
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+
+    table = pd.DataFrame(rows).set_index("scenario")
+    rank_columns = sorted((column for column in table.columns if column.startswith("rank_")),
+                          key=lambda column: int(column.split("_")[1]))
+    table[rank_columns] = table[rank_columns].fillna(0).astype(int)
+    return table
+
+
+def parse_scenario(text):
+    """Parses 'name:course_id=seats,course_id=seats' into a Scenario."""
+    name, _, overrides = text.rpartition(":")
+    capacities = {}
+    for override in filter(None, overrides.split(",")):
+        course_id, seats = override.split("=")
+        capacities[int(course_id)] = int(seats)
+    return Scenario(name or overrides, capacities)
+
+def load_scenarios(path):
+    """Reads a JSON list of Scenario fields, e.g. [{"name": "...", "capacities": {"103": 20}}]."""
+    with open(path) as handle:
+        entries = json.load(handle)
+    scenarios = []
+    for entry in entries:
+        entry = dict(entry)
+        entry["capacities"] = {int(course_id): int(seats) for course_id, seats in entry.get("capacities", {}).items()}
+        scenarios.append(Scenario(**entry))
+    return scenarios
+
+
+def main(argv=None, prog=None):
+    """Command line entry point; `argv` defaults to sys.argv[1:]."""
+    parser = argparse.ArgumentParser(prog=prog, description="Compare what-if capacity scenarios without touching Allocation_Results.")
+    parser.add_argument("--scenario", action="append", default=[], metavar="NAME:COURSE=SEATS,...",
+                        help="a capacity scenario; may be repeated")
+    parser.add_argument("--file", help="JSON file with a list of scenarios")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    scenarios = [parse_scenario(text) for text in args.scenario]
+    if args.file:
+        scenarios.extend(load_scenarios(args.file))
+
+    with db_connection() as connection:
+        if not connection:
+            raise SystemExit("Could not connect to the database.")
+        base_data = load_allocation_data(connection)
+
+    print(run_scenarios(base_data, scenarios, workers=args.workers).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,512 @@
+"""
+Live allocation service for add/drop.
+
+A long-running asyncio process loads Students, Courses, Preferences,
+Allocation_Results and Waitlists once. It then answers seat queries and
+applies requests and drops against in-memory state: residual capacity per
+course, the courses each student holds, and each course's waitlist in the
+order written by the allocator (see waitlists.py). Every request is a few dict
+and sorted-list operations on the event loop, so it is answered in
+microseconds.
+
+Changes are persisted to Allocation_Results and Waitlists write-behind. Each
+request only marks the rows it changed. A background task rewrites them in
+batches on a worker thread every `flush_interval` seconds, or sooner once
+`batch_size` changes are pending. At most every `publish_interval` seconds
+(and on shutdown) it also rebuilds the summary rows of the courses that
+changed and records an Allocation_Runs row, so the dashboard picks the
+changes up without its cache being emptied after every batch.
+
+Requests are JSON objects with an "op" field, sent as one line each over
+TCP, or passed straight to LocalClient in the same process:
+
+    {"op": "seat", "course": "Algorithms"}
+    {"op": "request", "student": 17, "course": 103, "replace": 101}
+    {"op": "drop", "student": 17, "course": 101}
+
+    python service.py --port 8765
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from allocate_courses import record_allocation_run, refresh_summary_tables
+from db import Error, db_connection
+from waitlists import Waitlist, load_waitlist_rows
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_PUBLISH_INTERVAL = 60.0
+
+
+class ServiceError(Exception):
+    """A request the service cannot apply, such as an unknown student or course."""
+
+
+class AllocationState:
+    """
+    In-memory allocation state. Every method runs to completion without
+    awaiting, so requests are applied one at a time on the event loop.
+    """
+
+    def __init__(self, students, courses, allocations, preferences, waitlisted=()):
+        # students: {student_id: cgpa}; courses: {course_id: (course_name, max_capacity)}
+        self.cgpa = {student_id: float(cgpa) for student_id, cgpa in students.items()}
+        self.course_names = {course_id: name for course_id, (name, _) in courses.items()}
+        self.course_ids_by_name = {name.lower(): course_id for course_id, name in self.course_names.items()}
+        self.capacity = {course_id: capacity for course_id, (_, capacity) in courses.items()}
+        self.preference_rank = {(student_id, course_id): rank for student_id, course_id, rank in preferences}
+
+        self.holdings = {student_id: set() for student_id in students}
+        self.seats_left = dict(self.capacity)
+        for student_id, course_id in allocations:
+            self.holdings[student_id].add(course_id)
+            self.seats_left[course_id] -= 1
+
+        # (student_id, course_id) pairs whose Allocation_Results or Waitlists
+        # row has changed since the last write.
+        self.dirty_allocations = set()
+        self.dirty_waitlists = set()
+
+        self.waitlists = {course_id: Waitlist() for course_id in courses}
+        # student_id -> {waitlisted course_id: course to give up once seated, or None}
+        self.waiting = {student_id: {} for student_id in students}
+        for course_id, student_id, _, replace_id in waitlisted:
+            if student_id in self.waiting and course_id in self.waitlists:
+                self._join_waitlist(student_id, course_id, replace_id)
+        self.dirty_waitlists.clear()
+
+    # --- Lookups ---
+
+    def course_id(self, course):
+        """Accepts a course id or a course name."""
+        if isinstance(course, str) and not course.isdigit():
+            course_id = self.course_ids_by_name.get(course.lower())
+        else:
+            course_id = int(course)
+        if course_id not in self.capacity:
+            raise ServiceError(f"Unknown course: {course}")
+        return course_id
+
+    def student_id(self, student):
+        student_id = int(student)
+        if student_id not in self.holdings:
+            raise ServiceError(f"Unknown student: {student}")
+        return student_id
+
+    def seat(self, course):
+        """Seats left and waitlist length of a course."""
+        course_id = self.course_id(course)
+        return {
+            "course_id": course_id,
+            "course_name": self.course_names[course_id],
+            "capacity": self.capacity[course_id],
+            "seats_left": self.seats_left[course_id],
+            "waitlist": len(self.waitlists[course_id]),
+        }
+
+    def student(self, student):
+        """The courses a student holds and their place on each waitlist they are on."""
+        student_id = self.student_id(student)
+        return {
+            "student_id": student_id,
+            "courses": sorted(self.holdings[student_id]),
+            "waitlisted": [{"course_id": course_id, "position": self.waitlists[course_id].position(student_id)}
+                           for course_id in sorted(self.waiting[student_id])],
+        }
+
+    # --- Changes ---
+
+    def request(self, student, course, replace=None):
+        """
+        Asks for a seat in `course`, giving up `replace` (if given) once seated.
+        Takes a free seat straight away, or joins the course's waitlist.
+        """
+        student_id = self.student_id(student)
+        course_id = self.course_id(course)
+        replace_id = self.course_id(replace) if replace is not None else None
+        if course_id in self.holdings[student_id]:
+            return {"status": "allocated", "course_id": course_id}
+        if replace_id is not None and replace_id not in self.holdings[student_id]:
+            raise ServiceError(f"Student {student_id} does not hold course {replace_id}")
+
+        if self.seats_left[course_id] > 0:
+            freed = self._assign(student_id, course_id, replace_id)
+            return {"status": "allocated", "course_id": course_id, "promoted": self._fill(freed)}
+
+        position = self._join_waitlist(student_id, course_id, replace_id)
+        return {"status": "waitlisted", "course_id": course_id, "position": position,
+                "waitlist": len(self.waitlists[course_id])}
+
+    def drop(self, student, course):
+        """Gives up a seat (or a waitlist place). A freed seat goes to the next student on the waitlist."""
+        student_id = self.student_id(student)
+        course_id = self.course_id(course)
+        if self._leave_waitlist(student_id, course_id):
+            return {"status": "left_waitlist", "course_id": course_id}
+        if course_id not in self.holdings[student_id]:
+            raise ServiceError(f"Student {student_id} does not hold course {course_id}")
+        self._vacate(student_id, course_id)
+        return {"status": "dropped", "course_id": course_id, "promoted": self._fill(course_id)}
+
+    def _join_waitlist(self, student_id, course_id, replace_id):
+        """Adds (or updates) a waitlist entry and returns the student's position."""
+        self.waiting[student_id][course_id] = replace_id
+        self.dirty_waitlists.add((student_id, course_id))
+        return self.waitlists[course_id].add(student_id, self.cgpa[student_id],
+                                             self.preference_rank.get((student_id, course_id)))
+
+    def _leave_waitlist(self, student_id, course_id):
+        if self.waiting[student_id].pop(course_id, False) is False:
+            return False
+        self.waitlists[course_id].remove(student_id)
+        self.dirty_waitlists.add((student_id, course_id))
+        return True
+
+    def _vacate(self, student_id, course_id):
+        self.holdings[student_id].discard(course_id)
+        self.seats_left[course_id] += 1
+        self.dirty_allocations.add((student_id, course_id))
+        # Waitlist entries that would have given this course up now just add a seat.
+        for other_id, replace_id in self.waiting[student_id].items():
+            if replace_id == course_id:
+                self.waiting[student_id][other_id] = None
+                self.dirty_waitlists.add((student_id, other_id))
+
+    def _assign(self, student_id, course_id, replace_id):
+        """Seats a student and gives up `replace_id`. Returns the course freed, if any."""
+        self._leave_waitlist(student_id, course_id)
+        if replace_id not in self.holdings[student_id]:
+            replace_id = None
+
+        # The student's other waitlist entries that would have given up the
+        # same course (or nothing, if they held no course) now give up this
+        # one instead, or are dropped if they rank this course higher.
+        rank = self.preference_rank.get((student_id, course_id))
+        unseated = not self.holdings[student_id]
+        for other_id, other_replace in list(self.waiting[student_id].items()):
+            if other_replace == replace_id and (other_replace is not None or unseated):
+                other_rank = self.preference_rank.get((student_id, other_id))
+                if rank is not None and other_rank is not None and other_rank > rank:
+                    self._leave_waitlist(student_id, other_id)
+                else:
+                    self.waiting[student_id][other_id] = course_id
+                    self.dirty_waitlists.add((student_id, other_id))
+
+        self.holdings[student_id].add(course_id)
+        self.seats_left[course_id] -= 1
+        self.dirty_allocations.add((student_id, course_id))
+        if replace_id is not None:
+            self._vacate(student_id, replace_id)
+        return replace_id
+
+    def _fill(self, course_id):
+        """
+        Fills the free seats of a course from its waitlist, next in line first.
+        A promoted student may give up another course, which is filled in turn.
+        Returns the promotions.
+        """
+        promoted = []
+        freed = [course_id] if course_id is not None else []
+        while freed:
+            course_id = freed.pop()
+            waitlist = self.waitlists[course_id]
+            while waitlist and self.seats_left[course_id] > 0:
+                student_id = waitlist.pop()
+                replace_id = self.waiting[student_id].pop(course_id)
+                self.dirty_waitlists.add((student_id, course_id))
+                promoted.append({"student_id": student_id, "course_id": course_id})
+                replaced = self._assign(student_id, course_id, replace_id)
+                if replaced is not None:
+                    freed.append(replaced)
+        return promoted
+
+    # --- Write-behind ---
+
+    def pending_count(self):
+        return len(self.dirty_allocations) + len(self.dirty_waitlists)
+
+    def take_pending(self):
+        """
+        Returns the changes made since the last call and starts a new batch.
+        Every changed (student_id, course_id) row is deleted and, if it still
+        exists in memory, inserted again with its current values.
+        """
+        allocations, self.dirty_allocations = sorted(self.dirty_allocations), set()
+        waitlisted, self.dirty_waitlists = sorted(self.dirty_waitlists), set()
+        return {
+            "allocations": allocations,
+            "allocation_rows": [(student_id, course_id, self.preference_rank.get((student_id, course_id)))
+                                for student_id, course_id in allocations
+                                if course_id in self.holdings[student_id]],
+            "waitlists": waitlisted,
+            "waitlist_rows": [(course_id, student_id, self.preference_rank.get((student_id, course_id)),
+                               self.waiting[student_id][course_id])
+                              for student_id, course_id in waitlisted
+                              if course_id in self.waiting[student_id]],
+        }
+
+    def restore_pending(self, changes):
+        """Marks a batch that could not be written as changed again, so it is retried."""
+        self.dirty_allocations.update(changes["allocations"])
+        self.dirty_waitlists.update(changes["waitlists"])
+
+
+def load_state(connection):
+    """Reads the tables the service needs into an AllocationState."""
+    waitlisted = load_waitlist_rows(connection)
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT student_id, cgpa FROM Students;")
+        students = {student_id: cgpa for student_id, cgpa in cursor.fetchall()}
+        cursor.execute("SELECT course_id, course_name, max_capacity FROM Courses;")
+        courses = {course_id: (name, capacity) for course_id, name, capacity in cursor.fetchall()}
+        cursor.execute("SELECT student_id, course_id FROM Allocation_Results;")
+        allocations = cursor.fetchall()
+        cursor.execute("SELECT student_id, course_id, preference_rank FROM Preferences;")
+        preferences = cursor.fetchall()
+    finally:
+        cursor.close()
+    return AllocationState(students, courses, allocations, preferences, waitlisted)
+
+
+def persist_changes(connection, changes):
+    """
+    Applies a batch from AllocationState.take_pending() to Allocation_Results
+    and Waitlists in one transaction. On error the transaction is rolled back
+    and the error is raised again, so the batch can be retried.
+    """
+    cursor = connection.cursor()
+    try:
+        if changes["allocations"]:
+            cursor.executemany("DELETE FROM Allocation_Results WHERE student_id = %s AND course_id = %s;",
+                               changes["allocations"])
+        if changes["allocation_rows"]:
+            cursor.executemany("INSERT INTO Allocation_Results (student_id, course_id, preference_rank) "
+                               "VALUES (%s, %s, %s);", changes["allocation_rows"])
+        if changes["waitlists"]:
+            cursor.executemany("DELETE FROM Waitlists WHERE student_id = %s AND course_id = %s;",
+                               changes["waitlists"])
+        if changes["waitlist_rows"]:
+            cursor.executemany("INSERT INTO Waitlists (course_id, student_id, preference_rank, replace_course_id) "
+                               "VALUES (%s, %s, %s, %s);", changes["waitlist_rows"])
+        connection.commit()
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def publish_changes(connection, course_ids, allocated_count=None):
+    """
+    Rebuilds the summary rows of the changed courses and Major_Summary, and
+    records the published changes as a run.
+    """
+    refresh_summary_tables(connection, course_ids)
+    record_allocation_run(connection, "service", allocated_count)
+
+
+class AllocationService:
+    """
+    Serves requests against an AllocationState and writes changes behind.
+
+        service = await AllocationService.start()
+        client = LocalClient(service)
+        await client.request(17, "Algorithms")
+        await service.stop()
+    """
+
+    OPERATIONS = ("seat", "student", "request", "drop")
+
+    def __init__(self, state, flush_interval=DEFAULT_FLUSH_INTERVAL, batch_size=DEFAULT_BATCH_SIZE,
+                 publish_interval=DEFAULT_PUBLISH_INTERVAL):
+        self.state = state
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.publish_interval = publish_interval
+        self.persisted = 0
+        self._wake = asyncio.Event()
+        self._flusher = None
+        self._stopping = False
+        # One flush at a time, so batches are written in order.
+        self._flush_lock = asyncio.Lock()
+        # Persisted but not yet published: whether anything changed, and the courses whose seats did.
+        self._unpublished = False
+        self._unpublished_courses = set()
+        self._published_at = time.monotonic()
+
+    @classmethod
+    async def start(cls, flush_interval=DEFAULT_FLUSH_INTERVAL, batch_size=DEFAULT_BATCH_SIZE,
+                    publish_interval=DEFAULT_PUBLISH_INTERVAL):
+        """Loads the state from the database and starts the write-behind task."""
+        state = await asyncio.get_running_loop().run_in_executor(None, _load_state_from_database)
+        service = cls(state, flush_interval, batch_size, publish_interval)
+        service._flusher = asyncio.create_task(service._flush_loop())
+        return service
+
+    def handle(self, request):
+        """Applies one request dict and returns the response dict."""
+        operation = request.get("op")
+        if operation not in self.OPERATIONS:
+            return {"ok": False, "error": f"Unknown op: {operation}"}
+        arguments = {key: value for key, value in request.items() if key != "op"}
+        try:
+            response = getattr(self.state, operation)(**arguments)
+        except (ServiceError, TypeError, ValueError) as err:
+            return {"ok": False, "error": str(err)}
+        if self.state.pending_count() >= self.batch_size:
+            self._wake.set()
+        return {"ok": True, **response}
+
+    async def flush(self, publish=False):
+        """
+        Persists every pending change now. The persisted changes are also
+        published once `publish_interval` has passed, or right away with
+        publish=True. Waits for a flush already in progress first.
+        """
+        async with self._flush_lock:
+            loop = asyncio.get_running_loop()
+            changes = self.state.take_pending()
+            count = len(changes["allocations"]) + len(changes["waitlists"])
+            if count:
+                try:
+                    await loop.run_in_executor(None, _persist_to_database, changes)
+                    self.persisted += count
+                    self._unpublished = True
+                    self._unpublished_courses.update(course_id for _, course_id in changes["allocations"])
+                except (Error, RuntimeError) as err:
+                    print(f"Error: '{err}'")
+                    # Newer changes to the same rows are written with this batch on the retry.
+                    self.state.restore_pending(changes)
+
+            if not self._unpublished:
+                return
+            if not publish and time.monotonic() - self._published_at < self.publish_interval:
+                return
+            allocated_count = sum(1 for courses in self.state.holdings.values() if courses)
+            course_ids = sorted(self._unpublished_courses)
+            try:
+                await loop.run_in_executor(None, _publish_to_database, course_ids, allocated_count)
+            except RuntimeError as err:
+                print(f"Error: '{err}'")
+                return
+            self._unpublished = False
+            self._unpublished_courses.clear()
+            self._published_at = time.monotonic()
+
+    async def _flush_loop(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._stopping:
+                break
+            await self.flush()
+
+    async def stop(self):
+        """
+        Stops the write-behind task and persists what is still pending. The
+        task is never cancelled mid-batch: it finishes the batch it is writing
+        and then exits.
+        """
+        self._stopping = True
+        self._wake.set()
+        if self._flusher is not None:
+            await self._flusher
+        await self.flush(publish=True)
+
+    async def serve_connection(self, reader, writer):
+        """Answers newline-delimited JSON requests on one TCP connection."""
+        try:
+            while line := await reader.readline():
+                try:
+                    response = self.handle(json.loads(line))
+                except (json.JSONDecodeError, AttributeError):
+                    response = {"ok": False, "error": "Requests must be JSON objects"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+def _load_state_from_database():
+    with db_connection() as connection:
+        if not connection:
+            raise RuntimeError("Could not connect to the database.")
+        return load_state(connection)
+
+
+def _persist_to_database(changes):
+    with db_connection() as connection:
+        if not connection:
+            raise RuntimeError("Could not connect to the database.")
+        persist_changes(connection, changes)
+
+
+def _publish_to_database(course_ids, allocated_count):
+    with db_connection() as connection:
+        if not connection:
+            raise RuntimeError("Could not connect to the database.")
+        publish_changes(connection, course_ids, allocated_count)
+
+
+class LocalClient:
+    """In-process client with the same request and response dicts as the TCP protocol."""
+
+    def __init__(self, service):
+        self.service = service
+
+    async def call(self, op, **arguments):
+        return self.service.handle({"op": op, **arguments})
+
+    async def seat(self, course):
+        return await self.call("seat", course=course)
+
+    async def student(self, student):
+        return await self.call("student", student=student)
+
+    async def request(self, student, course, replace=None):
+        return await self.call("request", student=student, course=course, replace=replace)
+
+    async def drop(self, student, course):
+        return await self.call("drop", student=student, course=course)
+
+
+async def serve(host="127.0.0.1", port=8765, flush_interval=DEFAULT_FLUSH_INTERVAL, batch_size=DEFAULT_BATCH_SIZE,
+                publish_interval=DEFAULT_PUBLISH_INTERVAL):
+    started = time.perf_counter()
+    service = await AllocationService.start(flush_interval, batch_size, publish_interval)
+    server = await asyncio.start_server(service.serve_connection, host, port)
+    print(f"Loaded {len(service.state.holdings)} students and {len(service.state.capacity)} courses "
+          f"in {time.perf_counter() - started:.2f}s. Serving on {host}:{port}.")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None, prog=None):
+    """Command line entry point; `argv` defaults to sys.argv[1:]."""
+    parser = argparse.ArgumentParser(prog=prog, description="Serve live seat queries, requests and drops.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL,
+                        help="seconds between write-behind batches")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="pending changes that trigger an early write")
+    parser.add_argument("--publish-interval", type=float, default=DEFAULT_PUBLISH_INTERVAL,
+                        help="seconds between summary refreshes and recorded runs for the dashboard")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.flush_interval, args.batch_size, args.publish_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Sharded in-memory allocation.
+
+Courses are split into shards, by department or by connected component of the
+preference graph, and the shards are packed onto worker processes by
+preference count. Each worker runs the rank passes of allocation_engine for
+its own courses only.
+
+A student lists exactly one course per rank, so within a rank pass no two
+shards ever compete for the same student. Students whose preferences cross
+shards only need settling between passes: every worker flags the students it
+admits in a shared `allocated` array and then waits at a barrier, so the next
+rank starts from the same state in every shard. This short coordination round
+makes the result identical to allocate(). Shards that share no students (such
+as connected components) skip it and run independently.
+
+    python allocate_courses.py --engine sharded --shard-by department --workers 4
+"""
+import copy
+import multiprocessing
+import os
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from allocation_engine import allocate, allocate_passes, attach_allocation_data, share_allocation_data
+
+SHARD_KEYS = ["department", "component"]
+
+
+def load_course_departments(connection):
+    """Returns a {course_id: department} mapping."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT course_id, department FROM Courses;")
+        return dict(cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def department_labels(data, departments):
+    """Labels every course with its department's number."""
+    _, labels = np.unique(np.array([departments.get(course_id, "") for course_id in data.course_ids.tolist()],
+                                   dtype=object), return_inverse=True)
+    return labels.astype(np.int32)
+
+
+def component_labels(data):
+    """
+    Labels every course with its connected component in the student-course
+    preference graph, by propagating the smallest course index across shared
+    students until nothing changes.
+    """
+    labels = np.arange(data.num_courses, dtype=np.int32)
+    while True:
+        student_labels = np.full(data.num_students, data.num_courses, dtype=np.int32)
+        np.minimum.at(student_labels, data.pref_student, labels[data.pref_course])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, data.pref_course, student_labels[data.pref_student])
+        if (new_labels == labels).all():
+            return labels
+        labels = new_labels
+
+
+def pack_shards(data, labels, workers):
+    """
+    Packs the labelled course groups onto at most `workers` shards, largest
+    group first onto the shard with the fewest preferences so far. Returns the
+    shard number of every course.
+    """
+    _, groups = np.unique(labels, return_inverse=True)
+    sizes = np.bincount(groups[data.pref_course], minlength=groups.max() + 1 if len(groups) else 0)
+    loads = [0] * min(workers, len(sizes))
+    shard_of_group = np.zeros(len(sizes), dtype=np.int32)
+    for group in np.argsort(-sizes, kind='stable').tolist():
+        shard = loads.index(min(loads))
+        shard_of_group[group] = shard
+        loads[shard] += int(sizes[group])
+    # Drop shards that ended up without courses and renumber the rest.
+    _, shard_of_course = np.unique(shard_of_group[groups], return_inverse=True)
+    return shard_of_course.astype(np.int32)
+
+
+def cross_shard_students(data, shard_of_course):
+    """Flags students whose preferences span more than one shard."""
+    pref_shard = shard_of_course[data.pref_course]
+    lowest = np.full(data.num_students, np.iinfo(np.int32).max, dtype=np.int32)
+    highest = np.full(data.num_students, -1, dtype=np.int32)
+    np.minimum.at(lowest, data.pref_student, pref_shard)
+    np.maximum.at(highest, data.pref_student, pref_shard)
+    return (highest >= 0) & (lowest != highest)
+
+
+def allocate_sharded(data, departments=None, workers=None):
+    """
+    Allocates like allocate(), but with one process per shard.
+
+    Courses are sharded by department when a {course_id: department} mapping
+    is given and by connected component otherwise. Returns the same
+    (student_index, course_index, preference_rank) arrays as allocate().
+    """
+    workers = workers or os.cpu_count() or 1
+    if data.num_courses == 0 or workers == 1:
+        return allocate(data)
+
+    labels = department_labels(data, departments) if departments is not None else component_labels(data)
+    shard_of_course = pack_shards(data, labels, workers)
+    num_shards = int(shard_of_course.max()) + 1
+    if num_shards == 1:
+        return allocate(data)
+
+    cross = cross_shard_students(data, shard_of_course)
+    print(f"Allocating {num_shards} shards in parallel; {int(cross.sum())} of {data.num_students} "
+          f"students have preferences in more than one shard.")
+
+    context = multiprocessing.get_context()
+    barrier = context.Barrier(num_shards) if cross.any() else None
+    results = context.Queue()
+    rank_values = np.unique(data.pref_rank)
+
+    segments, shared_spec = share_allocation_data(data)
+    allocated_segment = shared_memory.SharedMemory(create=True, size=max(data.num_students, 1))
+    segments.append(allocated_segment)
+    np.ndarray(data.num_students, dtype=bool, buffer=allocated_segment.buf)[...] = False
+    try:
+        processes = [
+            context.Process(target=_allocate_shard, args=(shared_spec, allocated_segment.name, shard_of_course,
+                                                          shard, rank_values, barrier, results))
+            for shard in range(num_shards)
+        ]
+        for process in processes:
+            process.start()
+        shard_results = _collect(results, processes)
+        for process in processes:
+            process.join()
+    finally:
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+
+    students = np.concatenate([result[0] for result in shard_results])
+    courses = np.concatenate([result[1] for result in shard_results])
+    ranks = np.concatenate([result[2] for result in shard_results])
+
+    # Same order as allocate(): by rank, then course, then priority.
+    order = np.lexsort((data.priority[students], courses, ranks))
+    return students[order], courses[order], ranks[order]
+
+
+def _collect(results, processes):
+    """Waits for one result per shard, failing if a worker dies or reports an error."""
+    shard_results = {}
+    while len(shard_results) < len(processes):
+        try:
+            shard, result = results.get(timeout=1)
+        except queue.Empty:
+            if any(process.exitcode not in (None, 0) for process in processes):
+                for process in processes:
+                    process.terminate()
+                raise RuntimeError("A shard worker exited without reporting a result.")
+            continue
+        if isinstance(result, str):
+            for process in processes:
+                process.terminate()
+            raise RuntimeError(f"Shard {shard} failed: {result}")
+        shard_results[shard] = result
+    return [shard_results[shard] for shard in sorted(shard_results)]
+
+
+def _allocate_shard(shared_spec, allocated_name, shard_of_course, shard, rank_values, barrier, results):
+    """Worker: runs the rank passes for one shard's courses against the shared state."""
+    try:
+        data = attach_allocation_data(shared_spec)
+        allocated_segment = shared_memory.SharedMemory(name=allocated_name)
+        allocated = np.ndarray(data.num_students, dtype=bool, buffer=allocated_segment.buf)
+
+        # A shallow copy keeps the student priorities computed when attaching.
+        keep = shard_of_course[data.pref_course] == shard
+        shard_data = copy.copy(data)
+        shard_data.pref_student = data.pref_student[keep]
+        shard_data.pref_course = data.pref_course[keep]
+        shard_data.pref_rank = data.pref_rank[keep]
+        after_rank = barrier.wait if barrier is not None else None
+        results.put((shard, allocate_passes(shard_data, allocated, rank_values, after_rank)))
+    except Exception as err:
+        if barrier is not None:
+            barrier.abort()
+        results.put((shard, repr(err)))
@@ -0,0 +1,172 @@
+"""
+Columnar snapshots of allocation runs.
+
+A snapshot is a directory per run holding Students, Courses, Preferences,
+Allocation_Results and the two summary tables as uncompressed Arrow IPC
+(Feather v2) files with compact column types. Uncompressed Arrow files can be
+memory-mapped, so analytics and the dashboard load a snapshot without a
+database round trip and without building Python objects for every row.
+
+    snapshots/
+        run_000042/
+            manifest.json
+            students.arrow
+            ...
+
+pyarrow is only needed to write or read snapshots.
+"""
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+SNAPSHOT_DIR = os.environ.get("ALLOCATOR_SNAPSHOT_DIR", "snapshots")
+FETCH_CHUNK_SIZE = 100_000
+
+# Table -> (source table, [(column, type name)]). Repeated labels such as
+# majors and departments are dictionary-encoded and load as pandas categoricals.
+SNAPSHOT_TABLES = {
+    "students": ("Students", [
+        ("student_id", "int32"), ("name", "string"), ("cgpa", "float32"), ("major", "dictionary")]),
+    "courses": ("Courses", [
+        ("course_id", "int32"), ("course_name", "string"), ("department", "dictionary"), ("max_capacity", "int32")]),
+    "preferences": ("Preferences", [
+        ("student_id", "int32"), ("course_id", "int32"), ("preference_rank", "int16")]),
+    "allocation_results": ("Allocation_Results", [
+        ("allocation_id", "int32"), ("student_id", "int32"), ("course_id", "int32"), ("preference_rank", "int16")]),
+    "course_summary": ("Course_Summary", [
+        ("course_id", "int32"), ("course_name", "string"), ("department", "dictionary"), ("max_capacity", "int32"),
+        ("preference_rank", "int16"), ("preferences", "int32"), ("allocated", "int32")]),
+    "major_summary": ("Major_Summary", [
+        ("major", "dictionary"), ("students", "int32"), ("allocated", "int32"),
+        ("first_choice_preferences", "int32"), ("first_choice_allocated", "int32")]),
+    "waitlists": ("Waitlists", [
+        ("course_id", "int32"), ("student_id", "int32"), ("preference_rank", "int16"), ("replace_course_id", "int32")]),
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for snapshots")
+
+
+def _arrow_array(values, type_name):
+    if type_name == "dictionary":
+        return pa.array(values, type=pa.string())
+    if type_name == "float32":
+        return pa.array([None if value is None else float(value) for value in values], type=pa.float32())
+    return pa.array(values, type=getattr(pa, type_name)())
+
+
+def _fetch_table(cursor, source, columns):
+    """Reads a table in chunks straight into Arrow record batches."""
+    names = [name for name, _ in columns]
+    cursor.execute(f"SELECT {', '.join(names)} FROM {source};")
+    batches = []
+    while True:
+        rows = cursor.fetchmany(FETCH_CHUNK_SIZE)
+        if not rows:
+            break
+        values = list(zip(*rows))
+        batches.append(pa.RecordBatch.from_arrays(
+            [_arrow_array(values[i], type_name) for i, (_, type_name) in enumerate(columns)], names=names))
+    if batches:
+        table = pa.Table.from_batches(batches).combine_chunks()
+    else:
+        table = pa.table({name: _arrow_array([], type_name) for name, type_name in columns})
+
+    # Dictionaries are sorted so categories load in the same order as the
+    # labels would sort in a query result.
+    for i, (name, type_name) in enumerate(columns):
+        if type_name == "dictionary":
+            values = table.column(name).combine_chunks()
+            labels = pc.unique(values.drop_null()).sort()
+            encoded = pa.DictionaryArray.from_arrays(pc.index_in(values, value_set=labels), labels)
+            table = table.set_column(i, name, encoded)
+    return table
+
+
+def snapshot_path(run_id, directory=None):
+    return os.path.join(directory or SNAPSHOT_DIR, f"run_{int(run_id):06d}")
+
+
+def write_snapshot(connection, run_id, directory=None):
+    """
+    Writes every SNAPSHOT_TABLES table for `run_id` and returns the snapshot's
+    directory. The files are written to a temporary directory first and moved
+    into place at the end, so readers never see a half-written snapshot.
+    """
+    _require_pyarrow()
+    target = snapshot_path(run_id, directory)
+    staging = target + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    manifest = {
+        "run_id": int(run_id),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "tables": {},
+    }
+    cursor = connection.cursor()
+    try:
+        for name, (source, columns) in SNAPSHOT_TABLES.items():
+            table = _fetch_table(cursor, source, columns)
+            feather.write_feather(table, os.path.join(staging, f"{name}.arrow"), compression="uncompressed")
+            manifest["tables"][name] = table.num_rows
+    finally:
+        cursor.close()
+
+    with open(os.path.join(staging, "manifest.json"), "w") as handle:
+        json.dump(manifest, handle, indent=2)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    print(f"Snapshot of run {run_id} written to {target}")
+    return target
+
+
+def list_snapshots(directory=None):
+    """Returns the run ids that have a complete snapshot, oldest first."""
+    directory = directory or SNAPSHOT_DIR
+    if not os.path.isdir(directory):
+        return []
+    run_ids = []
+    for entry in os.listdir(directory):
+        if entry.startswith("run_") and entry[4:].isdigit() \
+                and os.path.exists(os.path.join(directory, entry, "manifest.json")):
+            run_ids.append(int(entry[4:]))
+    return sorted(run_ids)
+
+
+def latest_snapshot(directory=None):
+    """Returns the newest snapshot's run id, or None if there is none."""
+    run_ids = list_snapshots(directory)
+    return run_ids[-1] if run_ids else None
+
+
+def load_snapshot(run_id=None, tables=None, directory=None):
+    """
+    Memory-maps the requested tables of a snapshot (the latest one by default)
+    and returns them as a {name: DataFrame} dict, or None if there is no
+    snapshot.
+    """
+    _require_pyarrow()
+    if run_id is None:
+        run_id = latest_snapshot(directory)
+        if run_id is None:
+            return None
+    path = snapshot_path(run_id, directory)
+    # Like list_snapshots(), only a snapshot with a manifest is complete.
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        return None
+    frames = {}
+    for name in tables or SNAPSHOT_TABLES:
+        with pa.memory_map(os.path.join(path, f"{name}.arrow")) as source:
+            frames[name] = pa.ipc.open_file(source).read_all().to_pandas()
+    return frames
@@ -0,0 +1,150 @@
+"""
+Per-course waitlists.
+
+After every allocation run the Waitlists table is rebuilt from the results. A
+student is on a course's waitlist when they ranked it above every course they
+were allocated, or when they were allocated nothing. Each entry records the
+course the student gives up once promoted (their worst-ranked allocation, or
+NULL if they hold none). Every waitlist is ordered by CGPA, then preference
+rank, then student_id, the same tie-break order as the allocation passes.
+
+The live service keeps the same order in memory with Waitlist, so promoting
+the next student when a seat frees up is a pop from the end of a sorted list
+instead of a new allocate_courses() run.
+"""
+from bisect import bisect_left, insort
+
+from db import Error
+from instrumentation import get_tracer
+
+WAITLISTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS Waitlists (
+        course_id INT NOT NULL,
+        student_id INT NOT NULL,
+        preference_rank INT,
+        replace_course_id INT,
+        PRIMARY KEY (course_id, student_id),
+        FOREIGN KEY (student_id) REFERENCES Students(student_id),
+        FOREIGN KEY (course_id) REFERENCES Courses(course_id)
+    );
+"""
+
+# Best and worst rank held by every allocated student; each rank names one
+# course per student, so the worst rank identifies the course to give up.
+REFRESH_WAITLISTS_QUERY = """
+    INSERT INTO Waitlists (course_id, student_id, preference_rank, replace_course_id)
+    SELECT p.course_id, p.student_id, p.preference_rank, worst.course_id
+    FROM Preferences p
+    LEFT JOIN (
+        SELECT student_id, MIN(preference_rank) AS best_rank, MAX(preference_rank) AS worst_rank
+        FROM Allocation_Results
+        GROUP BY student_id
+    ) held ON held.student_id = p.student_id
+    LEFT JOIN Allocation_Results worst
+        ON worst.student_id = held.student_id AND worst.preference_rank = held.worst_rank
+    WHERE held.student_id IS NULL OR p.preference_rank < held.best_rank;
+"""
+
+WAITLIST_ROWS_QUERY = """
+    SELECT w.course_id, w.student_id, w.preference_rank, w.replace_course_id
+    FROM Waitlists w;
+"""
+
+# Sorts entries without a preference rank (requests for unlisted courses)
+# after every ranked entry with the same CGPA.
+UNRANKED = float("inf")
+
+
+def create_waitlists_table(connection):
+    """Creates the Waitlists table if it does not exist yet."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(WAITLISTS_TABLE)
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def refresh_waitlists(connection):
+    """Rebuilds Waitlists from the current Allocation_Results in one transaction."""
+    create_waitlists_table(connection)
+    cursor = connection.cursor()
+    try:
+        with get_tracer().stage("refresh_waitlists") as record:
+            cursor.execute("DELETE FROM Waitlists;")
+            cursor.execute(REFRESH_WAITLISTS_QUERY)
+            record["rows"] = cursor.rowcount
+            connection.commit()
+    except Error as err:
+        print(f"Error: '{err}'")
+        connection.rollback()
+    finally:
+        cursor.close()
+
+
+def load_waitlist_rows(connection):
+    """Returns every (course_id, student_id, preference_rank, replace_course_id) row of Waitlists."""
+    create_waitlists_table(connection)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(WAITLIST_ROWS_QUERY)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+class Waitlist:
+    """
+    One course's waitlist as a sorted list of (cgpa, -preference_rank,
+    -student_id) keys, so the best student is always last. Taking the next
+    student is O(1) and a student's place in line is found in O(log n) by
+    bisection; adding or removing a student bisects too and then shifts the
+    list in a single memmove.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._key_of = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, student_id):
+        return student_id in self._key_of
+
+    def add(self, student_id, cgpa, preference_rank=None):
+        """Adds (or re-sorts) a student and returns their position, 1 being next in line."""
+        self.remove(student_id)
+        key = (float(cgpa), -(UNRANKED if preference_rank is None else preference_rank), -student_id)
+        insort(self._keys, key)
+        self._key_of[student_id] = key
+        return self.position(student_id)
+
+    def remove(self, student_id):
+        """Takes a student off the list. Returns False if they were not on it."""
+        key = self._key_of.pop(student_id, None)
+        if key is None:
+            return False
+        del self._keys[bisect_left(self._keys, key)]
+        return True
+
+    def position(self, student_id):
+        """Returns a student's place in line (1 is next), or None if they are not on the list."""
+        key = self._key_of.get(student_id)
+        if key is None:
+            return None
+        return len(self._keys) - bisect_left(self._keys, key)
+
+    def peek(self):
+        """Returns the next student without removing them, or None if the list is empty."""
+        return -self._keys[-1][2] if self._keys else None
+
+    def pop(self):
+        """Removes and returns the next student."""
+        student_id = -self._keys.pop()[2]
+        del self._key_of[student_id]
+        return student_id
+
+    def students(self):
+        """Returns the student ids in line order."""
+        return [-key[2] for key in reversed(self._keys)]